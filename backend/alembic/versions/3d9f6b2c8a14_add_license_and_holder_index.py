@@ -0,0 +1,101 @@
+"""Add license_index and holder_index tables
+
+Revision ID: 3d9f6b2c8a14
+Revises: 5a8c3e1d7f42
+Create Date: 2026-10-19 01:26:09.418530
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+import zstandard
+
+from softwarepassport.reports import Index
+
+
+# revision identifiers, used by Alembic.
+revision = '3d9f6b2c8a14'
+down_revision = '5a8c3e1d7f42'
+branch_labels = None
+depends_on = None
+
+BATCH = 50
+TABLES = ['license_index', 'holder_index']
+
+projects = sa.table(
+    'projects',
+    sa.column('url', sa.String),
+    sa.column('hash', sa.String),
+    sa.column('scancode_report_id', sa.String),
+)
+report_chunks = sa.table(
+    'report_chunks',
+    sa.column('report', sa.String),
+    sa.column('seq', sa.Integer),
+    sa.column('data', sa.LargeBinary),
+)
+
+
+def index_table(name):
+    return sa.table(
+        name,
+        sa.column('key', sa.String),
+        sa.column('url', sa.String),
+        sa.column('files', sa.Integer),
+        sa.column('hash', sa.String),
+    )
+
+
+def upgrade():
+    for name in TABLES:
+        op.create_table(name,
+        sa.Column('key', sa.String(), nullable=False),
+        sa.Column('url', sa.String(), nullable=False),
+        sa.Column('files', sa.Integer(), nullable=True),
+        sa.Column('hash', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('key', 'url')
+        )
+        op.create_index(op.f(f'ix_{name}_url'), name, ['url'], unique=False)
+        op.create_index(f'ix_{name}_rank', name, ['key', 'files', 'url'], unique=False)
+
+    license_index, holder_index = map(index_table, TABLES)
+    decompressor = zstandard.ZstdDecompressor()
+    connection = op.get_bind()
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects.c.url, projects.c.hash, projects.c.scancode_report_id)
+            .where(projects.c.scancode_report_id.isnot(None), projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        for url, hash, report_id in rows:
+            report = ''.join(
+                decompressor.decompress(data).decode()
+                for data in connection.execute(
+                    sa.select(report_chunks.c.data)
+                    .where(report_chunks.c.report == report_id)
+                    .order_by(report_chunks.c.seq)
+                ).scalars()
+            )
+            index = Index(json.loads(report).get('files', []))
+            for table, counts in [
+                (license_index, index.licenses),
+                (holder_index, index.holders),
+            ]:
+                if counts:
+                    connection.execute(
+                        table.insert(),
+                        [dict(key=k, url=url, files=n, hash=hash) for k, n in counts.items()],
+                    )
+        last = rows[-1].url
+
+
+def downgrade():
+    for name in TABLES:
+        op.drop_index(f'ix_{name}_rank', table_name=name)
+        op.drop_index(op.f(f'ix_{name}_url'), table_name=name)
+        op.drop_table(name)
@@ -0,0 +1,32 @@
+"""Add scancode_blobs table
+
+Revision ID: 4d6e1b0f7a93
+Revises: e8b3a5c94d21
+Create Date: 2026-10-18 16:41:07.583310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4d6e1b0f7a93'
+down_revision = 'e8b3a5c94d21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('scancode_blobs',
+    sa.Column('sha', sa.String(), nullable=False),
+    sa.Column('options', sa.String(), nullable=False),
+    sa.Column('result', sa.Text(), nullable=True),
+    sa.Column('date_last_used', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha', 'options')
+    )
+    op.create_index(op.f('ix_scancode_blobs_date_last_used'), 'scancode_blobs', ['date_last_used'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_scancode_blobs_date_last_used'), table_name='scancode_blobs')
+    op.drop_table('scancode_blobs')
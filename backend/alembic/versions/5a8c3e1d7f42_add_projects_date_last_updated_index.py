@@ -0,0 +1,24 @@
+"""Add index on projects.date_last_updated
+
+Revision ID: 5a8c3e1d7f42
+Revises: b7e2d05c93f1
+Create Date: 2026-10-18 23:14:38.271906
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a8c3e1d7f42'
+down_revision = 'b7e2d05c93f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_projects_date_last_updated'), 'projects', ['date_last_updated'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_projects_date_last_updated'), table_name='projects')
@@ -0,0 +1,73 @@
+"""Add stats table
+
+Revision ID: 7e4a1c9d2b63
+Revises: 3d9f6b2c8a14
+Create Date: 2026-10-19 03:41:27.806153
+
+"""
+from collections import Counter
+
+from alembic import op
+import sqlalchemy as sa
+
+from softwarepassport.models import tally
+
+
+# revision identifiers, used by Alembic.
+revision = '7e4a1c9d2b63'
+down_revision = '3d9f6b2c8a14'
+branch_labels = None
+depends_on = None
+
+BATCH = 500
+
+projects = sa.table(
+    'projects',
+    sa.column('url', sa.String),
+    sa.column('reuse_compliant', sa.Boolean),
+    sa.column('reuse_report_id', sa.String),
+    sa.column('scancode_summary', sa.JSON),
+    sa.column('sawroom_tag', sa.String),
+    sa.column('fabric_tag', sa.String),
+    sa.column('ethereum_tag', sa.String),
+    sa.column('planetmint_tag', sa.String),
+)
+stats = sa.table(
+    'stats',
+    sa.column('name', sa.String),
+    sa.column('slot', sa.Integer),
+    sa.column('value', sa.BigInteger),
+)
+
+
+def upgrade():
+    op.create_table('stats',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('slot', sa.Integer(), nullable=False),
+    sa.Column('value', sa.BigInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('name', 'slot')
+    )
+
+    connection = op.get_bind()
+    counts = Counter()
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects)
+            .where(projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        counts['projects'] += len(rows)
+        for row in rows:
+            counts.update(tally(row))
+        last = rows[-1].url
+    rows = [dict(name=name, slot=0, value=value) for name, value in counts.items() if value]
+    if rows:
+        connection.execute(stats.insert(), rows)
+
+
+def downgrade():
+    op.drop_table('stats')
@@ -0,0 +1,113 @@
+"""Add scancode_report_chunks table
+
+Revision ID: 9c1f4e7b2a58
+Revises: 4d6e1b0f7a93
+Create Date: 2026-10-18 19:26:44.108537
+
+"""
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+from softwarepassport.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f4e7b2a58'
+down_revision = '4d6e1b0f7a93'
+branch_labels = None
+depends_on = None
+
+BATCH = 50
+
+chunks = sa.table(
+    'scancode_report_chunks',
+    sa.column('report', sa.String),
+    sa.column('seq', sa.Integer),
+    sa.column('data', sa.Text),
+)
+
+
+def upgrade():
+    op.create_table('scancode_report_chunks',
+    sa.Column('report', sa.String(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('report', 'seq')
+    )
+    op.add_column('projects', sa.Column('scancode_report_id', sa.String(), nullable=True))
+
+    projects = sa.table(
+        'projects',
+        sa.column('url', sa.String),
+        sa.column('scancode_report', sa.String),
+        sa.column('scancode_report_id', sa.String),
+    )
+    connection = op.get_bind()
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects.c.url, projects.c.scancode_report)
+            .where(projects.c.scancode_report.isnot(None), projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        for url, report in rows:
+            id = uuid.uuid4().hex
+            size = settings.REPORT_CHUNK_SIZE
+            for seq, i in enumerate(range(0, len(report), size)):
+                connection.execute(
+                    chunks.insert().values(report=id, seq=seq, data=report[i : i + size])
+                )
+            connection.execute(
+                projects.update()
+                .where(projects.c.url == url)
+                .values(scancode_report_id=id)
+            )
+        last = rows[-1].url
+
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('scancode_report')
+
+
+def downgrade():
+    op.add_column('projects', sa.Column('scancode_report', sa.String(), nullable=True))
+
+    projects = sa.table(
+        'projects',
+        sa.column('url', sa.String),
+        sa.column('scancode_report', sa.String),
+        sa.column('scancode_report_id', sa.String),
+    )
+    connection = op.get_bind()
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects.c.url, projects.c.scancode_report_id)
+            .where(projects.c.scancode_report_id.isnot(None), projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        for url, id in rows:
+            report = ''.join(
+                connection.execute(
+                    sa.select(chunks.c.data)
+                    .where(chunks.c.report == id)
+                    .order_by(chunks.c.seq)
+                ).scalars()
+            )
+            connection.execute(
+                projects.update()
+                .where(projects.c.url == url)
+                .values(scancode_report=report)
+            )
+        last = rows[-1].url
+
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('scancode_report_id')
+    op.drop_table('scancode_report_chunks')
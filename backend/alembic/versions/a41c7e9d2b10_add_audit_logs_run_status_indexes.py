@@ -0,0 +1,26 @@
+"""Add audit_logs indexes for run status lookups
+
+Revision ID: a41c7e9d2b10
+Revises: 7bf590ff3c73
+Create Date: 2026-10-18 09:12:31.402117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41c7e9d2b10'
+down_revision = '7bf590ff3c73'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_audit_logs_url_date_created', 'audit_logs', ['url', 'date_created'], unique=False)
+    op.create_index('ix_audit_logs_url_state_date_created', 'audit_logs', ['url', 'state', 'date_created'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_audit_logs_url_state_date_created', table_name='audit_logs')
+    op.drop_index('ix_audit_logs_url_date_created', table_name='audit_logs')
@@ -0,0 +1,179 @@
+"""Store reports by content hash, zstd compressed
+
+Revision ID: b7e2d05c93f1
+Revises: 9c1f4e7b2a58
+Create Date: 2026-10-18 21:07:15.664302
+
+"""
+import hashlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+import zstandard
+
+from softwarepassport.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d05c93f1'
+down_revision = '9c1f4e7b2a58'
+branch_labels = None
+depends_on = None
+
+BATCH = 50
+
+projects = sa.table(
+    'projects',
+    sa.column('url', sa.String),
+    sa.column('reuse_report', sa.String),
+    sa.column('reuse_report_id', sa.String),
+    sa.column('scancode_report_id', sa.String),
+)
+scancode_chunks = sa.table(
+    'scancode_report_chunks',
+    sa.column('report', sa.String),
+    sa.column('seq', sa.Integer),
+    sa.column('data', sa.Text),
+)
+report_chunks = sa.table(
+    'report_chunks',
+    sa.column('report', sa.String),
+    sa.column('seq', sa.Integer),
+    sa.column('data', sa.LargeBinary),
+    sa.column('date_last_used', sa.DateTime),
+)
+
+
+def pieces(text):
+    size = settings.REPORT_CHUNK_SIZE
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def store(connection, text):
+    id = hashlib.sha256(text.encode()).hexdigest()
+    known = connection.execute(
+        sa.select(report_chunks.c.report).where(report_chunks.c.report == id).limit(1)
+    ).first()
+    if not known:
+        compressor = zstandard.ZstdCompressor(level=settings.REPORT_COMPRESSION_LEVEL)
+        for seq, data in enumerate(pieces(text)):
+            connection.execute(
+                report_chunks.insert().values(
+                    report=id,
+                    seq=seq,
+                    data=compressor.compress(data.encode()),
+                    date_last_used=datetime.utcnow(),
+                )
+            )
+    return id
+
+
+def text(connection, table, id, decode=lambda data: data):
+    return ''.join(
+        decode(data)
+        for data in connection.execute(
+            sa.select(table.c.data).where(table.c.report == id).order_by(table.c.seq)
+        ).scalars()
+    )
+
+
+def batches(connection, *columns):
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects.c.url, *columns)
+            .where(projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        yield rows
+        last = rows[-1].url
+
+
+def upgrade():
+    op.create_table('report_chunks',
+    sa.Column('report', sa.String(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('data', sa.LargeBinary(), nullable=True),
+    sa.Column('date_last_used', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('report', 'seq')
+    )
+    op.create_index(op.f('ix_report_chunks_date_last_used'), 'report_chunks', ['date_last_used'], unique=False)
+    op.add_column('projects', sa.Column('reuse_report_id', sa.String(), nullable=True))
+
+    connection = op.get_bind()
+    for rows in batches(connection, projects.c.reuse_report, projects.c.scancode_report_id):
+        for url, reuse_report, scancode_report_id in rows:
+            values = {}
+            if reuse_report is not None:
+                values['reuse_report_id'] = store(connection, reuse_report)
+            if scancode_report_id is not None:
+                report = text(connection, scancode_chunks, scancode_report_id)
+                values['scancode_report_id'] = store(connection, report)
+            if values:
+                connection.execute(
+                    projects.update().where(projects.c.url == url).values(**values)
+                )
+
+    op.drop_table('scancode_report_chunks')
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('reuse_report')
+    if connection.dialect.name == 'postgresql':
+        op.alter_column(
+            'projects',
+            'scancode_summary',
+            type_=postgresql.JSONB(),
+            postgresql_using='scancode_summary::jsonb',
+        )
+
+
+def downgrade():
+    connection = op.get_bind()
+    if connection.dialect.name == 'postgresql':
+        op.alter_column(
+            'projects',
+            'scancode_summary',
+            type_=sa.JSON(),
+            postgresql_using='scancode_summary::json',
+        )
+    op.add_column('projects', sa.Column('reuse_report', sa.String(), nullable=True))
+    op.create_table('scancode_report_chunks',
+    sa.Column('report', sa.String(), nullable=False),
+    sa.Column('seq', sa.Integer(), nullable=False),
+    sa.Column('data', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('report', 'seq')
+    )
+
+    decompressor = zstandard.ZstdDecompressor()
+
+    def decode(data):
+        return decompressor.decompress(data).decode()
+
+    copied = set()
+    for rows in batches(connection, projects.c.reuse_report_id, projects.c.scancode_report_id):
+        for url, reuse_report_id, scancode_report_id in rows:
+            if reuse_report_id is not None:
+                connection.execute(
+                    projects.update()
+                    .where(projects.c.url == url)
+                    .values(reuse_report=text(connection, report_chunks, reuse_report_id, decode))
+                )
+            # the projects sharing a report keep sharing its chunks
+            if scancode_report_id is not None and scancode_report_id not in copied:
+                report = text(connection, report_chunks, scancode_report_id, decode)
+                for seq, data in enumerate(pieces(report)):
+                    connection.execute(
+                        scancode_chunks.insert().values(
+                            report=scancode_report_id, seq=seq, data=data
+                        )
+                    )
+                copied.add(scancode_report_id)
+
+    with op.batch_alter_table('projects') as batch_op:
+        batch_op.drop_column('reuse_report_id')
+    op.drop_index(op.f('ix_report_chunks_date_last_used'), table_name='report_chunks')
+    op.drop_table('report_chunks')
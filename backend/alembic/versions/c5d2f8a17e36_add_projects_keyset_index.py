@@ -0,0 +1,24 @@
+"""Add projects index for keyset pagination
+
+Revision ID: c5d2f8a17e36
+Revises: a41c7e9d2b10
+Create Date: 2026-10-18 11:48:06.221904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5d2f8a17e36'
+down_revision = 'a41c7e9d2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_projects_date_created_url', 'projects', ['date_created', 'url'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_projects_date_created_url', table_name='projects')
@@ -0,0 +1,55 @@
+"""Add scancode_summary column to table projects
+
+Revision ID: e8b3a5c94d21
+Revises: c5d2f8a17e36
+Create Date: 2026-10-18 14:03:52.917264
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from softwarepassport.reports import summarize
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b3a5c94d21'
+down_revision = 'c5d2f8a17e36'
+branch_labels = None
+depends_on = None
+
+BATCH = 50
+
+
+def upgrade():
+    op.add_column('projects', sa.Column('scancode_summary', sa.JSON(), nullable=True))
+
+    projects = sa.table(
+        'projects',
+        sa.column('url', sa.String),
+        sa.column('scancode_report', sa.String),
+        sa.column('scancode_summary', sa.JSON),
+    )
+    connection = op.get_bind()
+    last = ''
+    while True:
+        rows = connection.execute(
+            sa.select(projects.c.url, projects.c.scancode_report)
+            .where(projects.c.scancode_report.isnot(None), projects.c.url > last)
+            .order_by(projects.c.url)
+            .limit(BATCH)
+        ).fetchall()
+        if not rows:
+            break
+        for url, report in rows:
+            connection.execute(
+                projects.update()
+                .where(projects.c.url == url)
+                .values(scancode_summary=summarize(json.loads(report)))
+            )
+        last = rows[-1].url
+
+
+def downgrade():
+    op.drop_column('projects', 'scancode_summary')
@@ -0,0 +1,142 @@
+"""
+Listing latency against project count
+
+    poetry run python benchmarks/listing.py --counts 100,1000,5000
+
+Fills a database with projects that went through a whole scan run and
+times the listing endpoints, `/repo_summary` (rendered without cache),
+a page of `/repositories` and the whole `/repositories?stream=true`,
+along with the run status lookup alone, one query per project
+(`AuditLog.last_status`) against the single set based query
+(`AuditLog.last_statuses`).
+
+A throwaway SQLite database is used unless `--database-url` is given.
+The tables of that database are dropped and recreated for every count,
+so point it to a scratch Postgres database and pass `--destroy`.
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from softwarepassport.app import app, get_db  # noqa: E402
+from softwarepassport.cache import summary_cache  # noqa: E402
+from softwarepassport.database import Base, create_api_engine  # noqa: E402
+from softwarepassport.models import AuditLog, Project, State  # noqa: E402
+
+
+def populate(db, count):
+    now = datetime.utcnow()
+    projects, logs = [], []
+    for i in range(count):
+        url = f"https://example.org/project-{i}.git"
+        created = now - timedelta(minutes=i)
+        projects.append(dict(url=url, hash=f"{i:040x}", date_created=created))
+        for state in State:
+            logs.append(
+                dict(
+                    url=url,
+                    state=state,
+                    date_created=created + timedelta(seconds=state.value),
+                )
+            )
+    with db.begin():
+        db.bulk_insert_mappings(Project, projects)
+        db.bulk_insert_mappings(AuditLog, logs)
+
+
+def timeit(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def get(client, path):
+    response = client.get(path)
+    response.raise_for_status()
+    return response
+
+
+def repo_summary(client):
+    summary_cache.bump()
+    get(client, "/repo_summary")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", default="100,500,1000,5000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument(
+        "--destroy",
+        action="store_true",
+        help="allow dropping the tables of --database-url",
+    )
+    args = parser.parse_args()
+    if args.database_url and not args.destroy:
+        parser.error(
+            "the tables of --database-url are dropped, pass --destroy "
+            "if it is a scratch database"
+        )
+
+    client = TestClient(app)
+    columns = [
+        "projects",
+        "/repo_summary",
+        "/repositories",
+        "stream",
+        "per project status",
+        "single status query",
+    ]
+    print(" ".join(f"{c:>19}" for c in columns) + "   (ms)")
+    for count in map(int, args.counts.split(",")):
+        url = args.database_url or "sqlite:///" + os.path.join(
+            tempfile.mkdtemp(), "listing.db"
+        )
+        engine = create_engine(url)
+        Base.metadata.drop_all(bind=engine)
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, autocommit=True)
+
+        api_engine = create_api_engine(url)
+
+        async def override_get_db():
+            async with AsyncSession(bind=api_engine, expire_on_commit=False) as db:
+                yield db
+                await db.commit()
+
+        app.dependency_overrides[get_db] = override_get_db
+        db = Session()
+        populate(db, count)
+        urls = [p.url for p in Project.all(db)]
+
+        timings = [
+            timeit(lambda: repo_summary(client), args.repeat),
+            timeit(lambda: get(client, "/repositories"), args.repeat),
+            timeit(lambda: get(client, "/repositories?stream=true"), args.repeat),
+            timeit(lambda: [AuditLog.last_status(u, db) for u in urls], args.repeat),
+            timeit(lambda: AuditLog.last_statuses(db), args.repeat),
+        ]
+        print(f"{count:>19} " + " ".join(f"{t:>19.1f}" for t in timings))
+
+        db.close()
+        asyncio.run(api_engine.dispose())
+        Base.metadata.drop_all(bind=engine)
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+"""
+End to end scan pipeline, offline, per stage
+
+    poetry run python benchmarks/pipeline.py --repos 20 --files 200 --output base.json
+    poetry run python benchmarks/pipeline.py --repos 20 --files 200 --compare base.json
+
+Builds `--repos` synthetic git repositories of `--files` files of about
+`--file-size` bytes, their kinds in the proportions of `--mix`, serves
+them from the disk (`file://`) or from a `git daemon` (`--transport
+git`) and scans them all with `Project.scan` on `--threads` threads,
+notarizing against the zenbridge stand-in. The scanners are started
+beforehand, as the worker does when it starts.
+
+    spdx     source with an SPDX header and a copyright notice
+    plain    source without any license information
+    license  the full text of a license
+    binary   random bytes
+    shared   the same file in every repository, as vendored code is
+
+Every stage of every scan is measured around its method: wall time,
+CPU time and the peak memory (proportional set size) of the process and
+its children while it ran. The CPU of a stage is the one of its thread
+plus, for the stages starting processes (git for `clone`, the scanners
+and the consolidation for `scancode`), the CPU of the child processes
+meanwhile: exact with a single thread, shared by the scans running at
+once otherwise.
+
+The results go to `--output` as JSON along with the commit and the
+options. `--compare` prints the changes from such a baseline and fails
+when repos/hour, or the mean wall time of a stage by more than half a
+second, regresses by more than `--tolerance`. Redis is expected at CELERY_BROKER, projects go to a
+throwaway SQLite database unless `--database-url` is given.
+"""
+import argparse
+import functools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import git
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from softwarepassport import models  # noqa: E402
+from softwarepassport.config import settings  # noqa: E402
+from softwarepassport.database import Base  # noqa: E402
+from softwarepassport.mirrors import MirrorCache  # noqa: E402
+from softwarepassport.models import Project  # noqa: E402
+from softwarepassport.scanners import scanners  # noqa: E402
+from throughput import LICENSES, start_zenbridge  # noqa: E402
+
+STAGES = ["clone", "reuse", "scancode", "blockchain"]
+# the stages whose child processes count in their CPU time
+CHILDREN = {"scan", "clone", "scancode"}
+MIT = """Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+def body(i, j, size):
+    lines, n = [], 0
+    while n < size:
+        line = f"\n\ndef f_{i}_{j}_{n}(x):\n    return x * {i * j + n}\n"
+        lines.append(line)
+        n += len(line)
+    return "".join(lines)
+
+
+def content(kind, i, j, size, rng):
+    """Bytes of the `j`th file of repository `i`, of kind `kind`"""
+    if kind == "spdx":
+        header = f"# SPDX-License-Identifier: {LICENSES[j % 4]}\n"
+        header += f"# Copyright (c) {2000 + j % 20} Author {i}\n"
+        return (header + body(i, j, size)).encode()
+    if kind == "plain":
+        return body(i, j, size).encode()
+    if kind == "license":
+        return f"Copyright (c) {2000 + j % 20} Author {i}\n\n{MIT}".encode()
+    if kind == "binary":
+        return rng.randbytes(size)
+    if kind == "shared":
+        return (f"# Copyright (c) 2010 Vendor {j}\n" + body(0, j, size)).encode()
+    raise ValueError(f"unknown file kind {kind}")
+
+
+def make_repo(root, i, files, mix, size):
+    rng = random.Random(i)
+    kinds = [kind for kind, weight in mix for _ in range(weight)]
+    repo = git.Repo.init(os.path.join(root, f"repo-{i}"))
+    for j in range(files):
+        kind = kinds[j % len(kinds)]
+        name = os.path.join(repo.working_dir, kind, f"pkg{j % 10}", f"file_{j}")
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        with open(name, "wb") as f:
+            f.write(content(kind, i, j, size, rng))
+    repo.git.add(A=True)
+    repo.index.commit("Synthetic project")
+    return os.path.basename(repo.working_dir)
+
+
+def serve(root, transport):
+    """The url of a repository of `root` by name, and the server process"""
+    if transport == "file":
+        return (lambda name: f"file://{os.path.join(root, name)}"), None
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    daemon = subprocess.Popen(
+        ["git", "daemon", "--reuseaddr", "--export-all", "--listen=127.0.0.1"]
+        + [f"--port={port}", f"--base-path={root}", root]
+    )
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            break
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+    return (lambda name: f"git://127.0.0.1:{port}/{name}"), daemon
+
+
+def descendants(pid):
+    """Pids of the processes under `pid`"""
+    parents = defaultdict(list)
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command may hold spaces, the fields follow its ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError):
+            continue
+        parents[ppid].append(int(entry))
+    found, pending = [], [pid]
+    while pending:
+        children = parents[pending.pop()]
+        found += children
+        pending += children
+    return found
+
+
+def children_cpu():
+    """CPU seconds of the child processes, ended and running"""
+    times = os.times()
+    seconds = times.children_user + times.children_system
+    for pid in descendants(os.getpid()):
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        # utime, stime, cutime, cstime
+        seconds += sum(int(v) for v in fields[11:15]) / os.sysconf("SC_CLK_TCK")
+    return seconds
+
+
+def pss(pid):
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class Sampler(threading.Thread):
+    """Memory of the process and its children, every `interval` seconds"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+
+    def sample(self):
+        pids = [os.getpid()] + descendants(os.getpid())
+        self.samples.append((time.perf_counter(), sum(pss(pid) for pid in pids)))
+
+    def run(self):
+        while True:
+            self.sample()
+            time.sleep(self.interval)
+
+    def peak(self, start, end):
+        return max((m for t, m in self.samples if start <= t <= end), default=0)
+
+
+def measure(name, fn, sampler, records):
+    @functools.wraps(fn)
+    def stage(self, *args, **kwargs):
+        start, cpu = time.perf_counter(), time.thread_time()
+        children = children_cpu() if name in CHILDREN else 0.0
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            sampler.sample()
+            end = time.perf_counter()
+            seconds = time.thread_time() - cpu
+            if name in CHILDREN:
+                seconds += children_cpu() - children
+            records[name].append(
+                dict(wall=end - start, cpu=seconds, memory=sampler.peak(start, end))
+            )
+
+    return stage
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summarize(records):
+    stages = {}
+    for name in STAGES + ["scan"]:
+        rows = records[name]
+        if not rows:
+            continue
+        wall = [r["wall"] for r in rows]
+        stages[name] = dict(
+            count=len(rows),
+            wall_mean=sum(wall) / len(wall),
+            wall_p50=percentile(wall, 0.5),
+            wall_p95=percentile(wall, 0.95),
+            wall_max=max(wall),
+            cpu_mean=sum(r["cpu"] for r in rows) / len(rows),
+            memory_peak_mb=max(r["memory"] for r in rows) / 1024**2,
+        )
+    return stages
+
+
+def commit():
+    try:
+        repo = git.Repo(os.path.dirname(__file__), search_parent_directories=True)
+        return repo.head.object.hexsha
+    except (git.InvalidGitRepositoryError, ValueError):
+        return None
+
+
+def compare(result, baseline, tolerance):
+    rows = [("repos/hour", baseline["repos_per_hour"], result["repos_per_hour"], -1, 0)]
+    for name, stage in result["stages"].items():
+        if name not in baseline["stages"]:
+            continue
+        before = baseline["stages"][name]
+        # a stage of a fraction of a second varies more than the tolerance
+        rows.append((f"{name} wall", before["wall_mean"], stage["wall_mean"], 1, 0.5))
+        rows.append((f"{name} cpu", before["cpu_mean"], stage["cpu_mean"], 0, 0))
+        rows.append((f"{name} MB", before["memory_peak_mb"], stage["memory_peak_mb"], 0, 0))
+    print(f"\nagainst {baseline['commit'] or 'baseline'}")
+    print(f"{'':>16} {'baseline':>10} {'current':>10} {'change':>10}")
+    failures = []
+    for label, before, after, worse, slack in rows:
+        change = (after - before) / before if before else 0.0
+        print(f"{label:>16} {before:>10.2f} {after:>10.2f} {change:>+10.1%}")
+        # only throughput and wall time gate, CPU and memory inform
+        if worse and change * worse > tolerance and abs(after - before) > slack:
+            failures.append(f"{label} {change:+.1%}")
+    if failures:
+        sys.exit("regressions past " + f"{tolerance:.0%}: " + ", ".join(failures))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repos", type=int, default=20)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--file-size", type=int, default=2048)
+    parser.add_argument("--mix", default="spdx:5,plain:2,license:1,binary:1,shared:1")
+    parser.add_argument("--transport", choices=["file", "git"], default="file")
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--processes", type=int, default=settings.SCANCODE_PROCESSES)
+    parser.add_argument("--notary-latency", type=float, default=0.1)
+    parser.add_argument("--database-url")
+    parser.add_argument("--destroy", action="store_true")
+    parser.add_argument("--output")
+    parser.add_argument("--compare")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    if args.database_url and not args.destroy:
+        parser.error("--database-url drops its tables, pass --destroy")
+    mix = [(kind, int(weight)) for kind, weight in (m.split(":") for m in args.mix.split(","))]
+
+    root = tempfile.mkdtemp()
+    names = [
+        make_repo(os.path.join(root, "repos"), i, args.files, mix, args.file_size)
+        for i in range(args.repos)
+    ]
+    url, daemon = serve(os.path.join(root, "repos"), args.transport)
+    start_zenbridge(args.notary_latency)
+    settings.SCANCODE_PROCESSES = args.processes
+    models.mirrors = MirrorCache(root=os.path.join(root, "mirrors"))
+    engine = create_engine(
+        args.database_url or "sqlite:///" + os.path.join(root, "pipeline.db"),
+        connect_args={} if args.database_url else {"check_same_thread": False, "timeout": 60},
+    )
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autocommit=True)
+
+    sampler = Sampler()
+    sampler.start()
+    records = defaultdict(list)
+    for name in STAGES + ["scan"]:
+        setattr(Project, name, measure(name, getattr(Project, name), sampler, records))
+    startup = time.perf_counter()
+    scanners.start()
+    startup = time.perf_counter() - startup
+
+    def scan(name):
+        db = Session()
+        try:
+            Project(url=url(name)).scan(db)
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        list(executor.map(scan, names))
+    elapsed = time.perf_counter() - start
+    db = Session()
+    # scan swallows the errors of its stages, count what actually finished
+    complete = sum(Project.by_url(url(name), db).complete for name in names)
+    db.close()
+    scanners.stop()
+    if daemon:
+        daemon.terminate()
+
+    result = dict(
+        commit=commit(),
+        date=datetime.utcnow().isoformat(),
+        host=dict(platform=platform.platform(), cpus=os.cpu_count()),
+        options=vars(args),
+        startup=startup,
+        seconds=elapsed,
+        complete=complete,
+        repos_per_hour=complete * 3600 / elapsed,
+        stages=summarize(records),
+    )
+    print(f"{complete}/{args.repos} repos in {elapsed:.1f}s, {result['repos_per_hour']:.0f} repos/hour")
+    columns = ["stage", "count", "wall", "p50", "p95", "max", "cpu", "peak MB"]
+    print(" ".join(f"{c:>10}" for c in columns))
+    for name, s in result["stages"].items():
+        print(
+            f"{name:>10} {s['count']:>10} {s['wall_mean']:>10.2f} {s['wall_p50']:>10.2f} "
+            f"{s['wall_p95']:>10.2f} {s['wall_max']:>10.2f} {s['cpu_mean']:>10.2f} "
+            f"{s['memory_peak_mb']:>10.0f}"
+        )
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f), args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Size, save and read latency of the stored reports
+
+    poetry run python benchmarks/reports.py --projects 200 --forks 4 --files 2000
+
+Saves `--projects` projects with a synthetic scancode report of
+`--files` files and a REUSE lint output, every distinct report shared by
+`--forks` projects, as forks of a repository are. `columns` is the
+former layout, both reports as text columns of `projects` written by
+every save, `store` the compressed content addressed `report_chunks`.
+
+`size` is the space the tables take, `save` the mean time to store the
+reports of a project and save it, `resave` to save it again with a
+notarization tag as the later stages do, `read` the mean time to read a
+whole scancode report back.
+
+A throwaway SQLite database is used unless `--database-url` is given.
+Its tables are dropped and recreated, so point it to a scratch Postgres
+database and pass `--destroy`.
+"""
+import argparse
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+from sqlalchemy import JSON, Column, String, create_engine, select, text
+from sqlalchemy.orm import declarative_base, sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from softwarepassport.database import Base  # noqa: E402
+from softwarepassport.models import Project, ReportChunk  # noqa: E402
+from softwarepassport.reports import summarize  # noqa: E402
+
+LICENSES = ["mit", "apache-2.0", "gpl-3.0-or-later", "bsd-new"]
+Legacy = declarative_base()
+
+
+class LegacyProject(Legacy):
+    __tablename__ = "legacy_projects"
+
+    url = Column(String, primary_key=True)
+    reuse_report = Column(String)
+    scancode_report = Column(String)
+    scancode_summary = Column(JSON)
+    sawroom_tag = Column(String)
+
+
+def make_report(i, files):
+    rng = random.Random(i)
+    authors = [f"{rng.getrandbits(32):x} {rng.getrandbits(32):x}" for _ in range(20)]
+    report = dict(
+        files=[
+            dict(
+                path=f"pkg{j % 10}/module_{j}.py",
+                type="file",
+                detected_license_expression=LICENSES[j % 4],
+                license_detections=[
+                    dict(
+                        license_expression=LICENSES[j % 4],
+                        matches=[
+                            dict(
+                                score=100.0,
+                                start_line=(line := rng.randrange(1, 40)),
+                                end_line=line,
+                                matched_length=5,
+                                match_coverage=100.0,
+                                matcher="1-spdx-id",
+                                license_expression=LICENSES[j % 4],
+                                rule_identifier=f"spdx-license-identifier-{LICENSES[j % 4]}",
+                                from_file=f"pkg{j % 10}/module_{j}.py",
+                            )
+                        ],
+                    )
+                ],
+                copyrights=[
+                    dict(
+                        copyright=f"Copyright (c) {rng.randrange(1990, 2023)} {author}",
+                        start_line=line + 1,
+                        end_line=line + 1,
+                    )
+                ],
+                holders=[dict(holder=author, start_line=line + 1, end_line=line + 1)],
+                emails=[
+                    dict(
+                        email=f"{author.split()[0]}@example.org",
+                        start_line=line + 1,
+                        end_line=line + 1,
+                    )
+                ],
+                urls=[],
+                scan_errors=[],
+            )
+            for j in range(files)
+            for author in [rng.choice(authors)]
+        ],
+        consolidated_components=[
+            dict(
+                identifier=f"author_{i}_1",
+                consolidated_copyright=f"Copyright (c) Author {i}",
+                consolidated_license_expression=" AND ".join(LICENSES),
+                files_count=files,
+            )
+        ],
+    )
+    lint = "\n".join(f"* pkg{j % 10}/module_{j}.py" for j in range(files))
+    return json.dumps(report), f"# SUMMARY\n\n{lint}\n\nCongratulations!\n"
+
+
+def table_size(engine, tables):
+    with engine.connect() as connection:
+        if engine.dialect.name == "postgresql":
+            return sum(
+                connection.execute(
+                    text("SELECT pg_total_relation_size(:t)"), dict(t=t)
+                ).scalar()
+                for t in tables
+            )
+        return sum(
+            connection.execute(
+                text(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+                    "(SELECT name FROM sqlite_master WHERE tbl_name = :t)"
+                ),
+                dict(t=t),
+            ).scalar()
+            or 0
+            for t in tables
+        )
+
+
+def save_columns(db, url, report, lint, tag=None):
+    db.merge(
+        LegacyProject(
+            url=url,
+            reuse_report=lint,
+            scancode_report=report,
+            scancode_summary=summarize(json.loads(report)),
+            sawroom_tag=tag,
+        )
+    )
+    db.commit()
+
+
+def save_store(db, url, report, lint, tag=None):
+    if tag is None:
+        ids = dict(
+            reuse_report_id=ReportChunk.store(io.StringIO(lint), db),
+            scancode_report_id=ReportChunk.store(io.StringIO(report), db),
+            scancode_summary=summarize(json.loads(report)),
+        )
+    else:
+        # the later stages save the project along with the ids only
+        ids = {}
+    db.merge(Project(url=url, sawroom_tag=tag, **ids))
+    db.commit()
+
+
+def read_columns(db, url):
+    return db.execute(
+        select(LegacyProject.scancode_report).where(LegacyProject.url == url)
+    ).scalar()
+
+
+def read_store(db, url):
+    id = db.execute(select(Project.scancode_report_id).where(Project.url == url)).scalar()
+    return ReportChunk.text(id, db)
+
+
+MODES = {
+    "columns": (save_columns, read_columns, ["legacy_projects"]),
+    "store": (save_store, read_store, ["projects", "report_chunks"]),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--forks", type=int, default=4)
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--database-url")
+    parser.add_argument("--destroy", action="store_true")
+    args = parser.parse_args()
+    if args.database_url and not args.destroy:
+        parser.error("--database-url drops its tables, pass --destroy")
+
+    url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/reports.db"
+    engine = create_engine(url)
+    for metadata in (Base.metadata, Legacy.metadata):
+        metadata.drop_all(engine)
+        metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+
+    reports = [make_report(i, args.files) for i in range(-(-args.projects // args.forks))]
+    print(f"report {len(reports[0][0]) / 1024:.0f} KB, {len(reports)} distinct")
+    columns = ["layout", "size MB", "save ms", "resave ms", "read ms"]
+    print(" ".join(f"{c:>10}" for c in columns))
+    for mode, (save, read, tables) in MODES.items():
+        start = time.perf_counter()
+        for i in range(args.projects):
+            report, lint = reports[i // args.forks]
+            save(db, f"https://example.org/{i}.git", report, lint)
+        saving = (time.perf_counter() - start) / args.projects
+        start = time.perf_counter()
+        for i in range(args.projects):
+            report, lint = reports[i // args.forks]
+            save(db, f"https://example.org/{i}.git", report, lint, tag=f"{i:x}")
+        resaving = (time.perf_counter() - start) / args.projects
+        start = time.perf_counter()
+        for i in range(args.projects):
+            assert read(db, f"https://example.org/{i}.git") == reports[i // args.forks][0]
+        reading = (time.perf_counter() - start) / args.projects
+        size = table_size(engine, tables) / 1024**2
+        print(
+            f"{mode:>10} {size:>10.1f} {saving * 1000:>10.1f} "
+            f"{resaving * 1000:>10.1f} {reading * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Setup against scan time of scancode, fresh pool per scan or warm scanners
+
+    poetry run python benchmarks/scanners.py --repos 10 --files 20 --processes 2
+
+Each mode scans the same small synthetic checkouts, one after the other
+in a fresh worker process. `run_scan` is the former path, scancode on
+the whole checkout with its own pool of `--processes`. `scanners` hands
+the files in `--processes` chunks to the warm pool, started beforehand
+as the worker does when it starts.
+
+`scan` is the time scancode spent on the files (the sum of their
+`scan_timings` over the processes), `setup` the rest of the wall time
+of the scan: pool start, index loading, codebase setup and teardown.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from softwarepassport import blobcache  # noqa: E402
+from softwarepassport.scanners import scanners  # noqa: E402
+from throughput import make_repo  # noqa: E402
+
+
+def scan(mode, path, processes):
+    options = dict(blobcache.OPTIONS, timing=True)
+    if mode == "run_scan":
+        from scancode.cli import run_scan
+
+        _, report = run_scan(
+            path,
+            strip_root=True,
+            only_findings=False,
+            quiet=True,
+            processes=processes,
+            **options,
+        )
+        files = report["files"]
+    else:
+        names = [
+            os.path.relpath(os.path.join(root, name), path)
+            for root, _, names in os.walk(path)
+            if ".git" not in root
+            for name in names
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            chunks = []
+            for i, chunk in enumerate(blobcache.split(path, names, processes)):
+                for name in chunk:
+                    os.makedirs(os.path.dirname(os.path.join(tmp, str(i), name)), exist_ok=True)
+                    os.link(os.path.join(path, name), os.path.join(tmp, str(i), name))
+                chunks.append(os.path.join(tmp, str(i)))
+            files, _ = scanners.scan(chunks, options)
+    return sum(sum((f.get("scan_timings") or {}).values()) for f in files) / processes
+
+
+def worker(mode, urls, processes):
+    start = time.perf_counter()
+    if mode == "scanners":
+        scanners.size = processes
+        scanners.start()
+    startup = time.perf_counter() - start
+    rows = []
+    for url in urls:
+        start = time.perf_counter()
+        seconds = scan(mode, url[len("file://"):], processes)
+        rows.append((time.perf_counter() - start, seconds))
+    scanners.stop()
+    print(json.dumps(dict(startup=startup, rows=rows)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repos", type=int, default=10)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=2)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        mode, root = args.worker.split(":", 1)
+        urls = sorted(f"file://{os.path.join(root, d)}" for d in os.listdir(root))
+        return worker(mode, urls, args.processes)
+
+    root = tempfile.mkdtemp()
+    for i in range(args.repos):
+        make_repo(root, i, args.files)
+    columns = ["mode", "startup", "first", "wall", "scan", "setup"]
+    print(" ".join(f"{c:>10}" for c in columns))
+    for mode in ["run_scan", "scanners"]:
+        out = subprocess.run(
+            [sys.executable, __file__, f"--worker={mode}:{root}"]
+            + [f"--processes={args.processes}"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        result = json.loads(out.splitlines()[-1])
+        (first, _), *rest = result["rows"]
+        wall = sum(r[0] for r in rest) / len(rest)
+        seconds = sum(r[1] for r in rest) / len(rest)
+        print(
+            f"{mode:>10} {result['startup']:>10.2f} {first:>10.2f} "
+            f"{wall:>10.2f} {seconds:>10.2f} {wall - seconds:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Import time and resident memory of the API process
+
+    poetry run python benchmarks/startup.py --max-seconds 1.5 --max-rss 120
+
+Imports `softwarepassport.app` in fresh interpreters, as each uvicorn
+worker does, and reports the median import time and the peak RSS. The
+`worker` row also loads the scan engines (`load_engines`), what every
+API process paid before they were imported lazily. With `--max-seconds`
+or `--max-rss` (MB) the run fails when the API process exceeds them,
+a regression guard for an engine imported back at module level.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import softwarepassport.app as app
+if sys.argv[1] == "worker":
+    app.load_engines()
+print(json.dumps(dict(
+    seconds=time.perf_counter() - start,
+    rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    engines=[m for m in app.ENGINES if m in sys.modules],
+)))
+"""
+
+
+def measure(role, runs):
+    root = os.path.join(os.path.dirname(__file__), "..")
+    samples = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", PROBE, role],
+                cwd=root,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        )
+        for _ in range(runs)
+    ]
+    return (
+        statistics.median(s["seconds"] for s in samples),
+        max(s["rss"] for s in samples),
+        samples[-1]["engines"],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float)
+    parser.add_argument("--max-rss", type=float)
+    args = parser.parse_args()
+
+    print(f"{'process':>10} {'seconds':>10} {'rss MB':>10}  engines")
+    results = {}
+    for role in ["api", "worker"]:
+        results[role] = seconds, rss, engines = measure(role, args.runs)
+        print(f"{role:>10} {seconds:>10.2f} {rss:>10.0f}  {', '.join(engines) or '-'}")
+
+    seconds, rss, engines = results["api"]
+    failures = []
+    if engines:
+        failures.append(f"the API process loads {', '.join(engines)}")
+    if args.max_seconds is not None and seconds > args.max_seconds:
+        failures.append(f"import takes {seconds:.2f}s > {args.max_seconds}s")
+    if args.max_rss is not None and rss > args.max_rss:
+        failures.append(f"RSS is {rss:.0f} MB > {args.max_rss} MB")
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
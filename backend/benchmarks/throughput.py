@@ -0,0 +1,135 @@
+"""
+Scan throughput against worker concurrency and CPU budget
+
+    poetry run python benchmarks/throughput.py --configs 30:240:8,8:8:4,4:8:8
+
+Each config is `threads:cores:processes`, the worker threads scanning
+at once, the CPU budget shared by their reuse and scancode stages and
+the most scancode processes a scan asks for. `30:240:8` is the former
+unbounded worker, 30 threads each running scancode with 8 processes.
+
+Every config scans freshly generated local repositories (unique
+content, so the scancode cache never hits) end to end with
+`Project.scan`, notarizing against the zenbridge stand-in, and reports
+repos/hour (of the scans which completed every stage) along with the
+load average of the host. Redis is expected at CELERY_BROKER, projects
+go to a throwaway SQLite database.
+"""
+import argparse
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import git
+import uvicorn
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from softwarepassport import zenbridge  # noqa: E402
+from softwarepassport.budget import cpu  # noqa: E402
+from softwarepassport.config import settings  # noqa: E402
+from softwarepassport.database import Base  # noqa: E402
+from softwarepassport.models import Project  # noqa: E402
+
+HEADER = "# SPDX-License-Identifier: {license}\n# Copyright (c) {year} Author {i}\n"
+LICENSES = ["MIT", "Apache-2.0", "GPL-3.0-or-later", "BSD-3-Clause"]
+
+
+def make_repo(root, i, files):
+    repo = git.Repo.init(os.path.join(root, f"repo-{i}"))
+    for j in range(files):
+        name = os.path.join(repo.working_dir, f"pkg{j % 10}", f"module_{j}.py")
+        os.makedirs(os.path.dirname(name), exist_ok=True)
+        with open(name, "w") as f:
+            f.write(HEADER.format(license=LICENSES[j % 4], year=2000 + j % 20, i=i))
+            f.write(f"\n\ndef f_{i}_{j}():\n    return {i * j}\n" * 20)
+    repo.git.add(A=True)
+    repo.index.commit("Synthetic project")
+    return f"file://{repo.working_dir}"
+
+
+def start_zenbridge(latency):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    zenbridge.app.state.latency = latency
+    server = uvicorn.Server(
+        uvicorn.Config(zenbridge.app, port=port, log_level="warning")
+    )
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    for chain in ["sawroom", "fabric", "ethereum", "planetmint"]:
+        setattr(
+            settings,
+            chain.upper(),
+            f"http://127.0.0.1:{port}/api/zenbridge/{chain}-write",
+        )
+
+
+def run(urls, threads, Session):
+    def scan(url):
+        db = Session()
+        try:
+            Project(url=url).scan(db)
+        finally:
+            db.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(scan, urls))
+    elapsed = time.perf_counter() - start
+    db = Session()
+    # scan swallows the errors of its stages, count what actually finished
+    complete = sum(Project.by_url(url, db).complete for url in urls)
+    db.close()
+    return elapsed, complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--configs", default=f"30:240:8,8:{cpu.cores}:4")
+    parser.add_argument("--repos", type=int, default=24)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--notary-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    start_zenbridge(args.notary_latency)
+    budget_root = cpu.root
+    columns = ["threads", "cores", "procs", "seconds", "repos/hour", "load"]
+    print(" ".join(f"{c:>10}" for c in columns))
+    for n, config in enumerate(args.configs.split(",")):
+        threads, cores, processes = map(int, config.split(":"))
+        cpu.cores = cores
+        # fresh slot files, a previous config may still be winding down
+        cpu.root = budget_root.with_name(f"{budget_root.name}-bench-{n}")
+        settings.SCANCODE_PROCESSES = processes
+
+        engine = create_engine(
+            "sqlite:///" + os.path.join(root, f"throughput-{n}.db"),
+            connect_args={"check_same_thread": False, "timeout": 60},
+        )
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine, autocommit=True)
+        urls = [
+            make_repo(os.path.join(root, f"config-{n}"), i, args.files)
+            for i in range(args.repos)
+        ]
+
+        elapsed, complete = run(urls, threads, Session)
+        print(
+            f"{threads:>10} {cores:>10} {processes:>10} {elapsed:>10.1f} "
+            f"{complete * 3600 / elapsed:>10.0f} {os.getloadavg()[0]:>10.1f}"
+        )
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,52 @@
+import importlib
 import json
 import logging
+import time
+from typing import Optional, Tuple
 
 import uvicorn
-import git
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_init, worker_shutdown
 from celery.utils.log import get_task_logger
-from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette.status import HTTP_201_CREATED, HTTP_202_ACCEPTED
 
+from . import blobcache, notary, profiler
+from .cache import summary_cache
 from .config import settings
-from .database import SessionLocal, engine
-from .models import AuditLog, Base, Project
-from .schemas import RepoBase
+from .database import AsyncSessionLocal, SessionLocal, get_async_engine, pool_stats
+from .events import bus, format_event
+from .lib import decode_cursor, encode_cursor
+from .flights import Flight, running
+from .lanes import PRIORITY, TRANSPORT_OPTIONS, lanes, queue_depth
+from .metrics import (
+    CONTENT_TYPE_LATEST,
+    DB_ROUND_TRIPS,
+    QUEUE_WAIT_SECONDS,
+    exposition,
+    round_trips,
+    serve,
+)
+from .mirrors import RepositoryNotFound, Unreachable, probe, remote_heads
+from .models import (
+    AuditLog,
+    Base,
+    HolderIndex,
+    LicenseIndex,
+    Project,
+    ReportChunk,
+    Stat,
+)
+from .scanners import scanners
+from .reports import license_keys, normalize_holder
+from .schemas import RepoBase, RepoBatch
 
 # Base.metadata.create_all(bind=engine, checkfirst=True)
 
@@ -22,6 +54,63 @@ celery = Celery(
     __name__, broker=settings.CELERY_BROKER, backend=settings.CELERY_BACKEND
 )
 celery_log = get_task_logger(__name__)
+# scans hold CPU for minutes, they get their own workers so the quick
+# I/O bound tasks (the scheduled remote probes) are never queued behind them
+celery.conf.task_default_queue = "light"
+celery.conf.task_routes = {
+    f"{__name__}.scan_task": {"queue": "heavy"},
+    f"{__name__}.refresh_task": {"queue": "light"},
+    f"{__name__}.refresh_all_task": {"queue": "light"},
+    f"{__name__}.dispatch_task": {"queue": "light"},
+}
+# the scans reach the broker through the lanes, with the priority of
+# theirs; a worker reserves no more than it runs, the others stay in order
+celery.conf.broker_transport_options = TRANSPORT_OPTIONS
+celery.conf.worker_prefetch_multiplier = 1
+# imported by the scan stages only, the API process never loads them
+ENGINES = ["git", "requests", "reuse.lint", "reuse.project", "scancode.cli"]
+celery.conf.beat_schedule = {
+    "refresh": {
+        "task": f"{__name__}.refresh_all_task",
+        "schedule": settings.REFRESH_INTERVAL,
+    },
+    "dispatch": {
+        "task": f"{__name__}.dispatch_task",
+        "schedule": settings.SCAN_DISPATCH_INTERVAL,
+    },
+}
+
+
+@worker_init.connect
+def load_engines(sender=None, **kwargs):
+    """Workers load the scan engines as they start, not on their first scan"""
+    for module in ENGINES:
+        importlib.import_module(module)
+    # the scanners of the workers consuming the scans
+    if sender is not None and "heavy" in sender.app.amqp.queues:
+        scanners.start()
+
+
+@worker_init.connect
+def serve_metrics(**kwargs):
+    if settings.WORKER_METRICS_PORT:
+        serve(settings.WORKER_METRICS_PORT)
+
+
+@worker_shutdown.connect
+def stop_scanners(**kwargs):
+    scanners.stop()
+
+
+@task_prerun.connect
+def start_profile(task_id=None, **kwargs):
+    profiler.start(task_id)
+
+
+@task_postrun.connect
+def stop_profile(task_id=None, task=None, **kwargs):
+    profiler.stop(task_id, task.name.rsplit(".", 1)[-1])
+
 
 app = FastAPI(title="Software Passport API")
 L = logging.getLogger("uvicorn.error")
@@ -48,12 +137,25 @@ async def catch_exceptions_middleware(request: Request, call_next):
 app.middleware("http")(catch_exceptions_middleware)
 
 
-def get_db():
-    db = SessionLocal()
+async def count_round_trips_middleware(request: Request, call_next):
+    counter = [0]
+    token = round_trips.set(counter)
     try:
-        yield db
+        return await call_next(request)
     finally:
-        db.close()
+        round_trips.reset(token)
+        # set on the scope by the router, none for an unknown path
+        endpoint = getattr(request.scope.get("endpoint"), "__name__", "none")
+        DB_ROUND_TRIPS.labels(endpoint).observe(counter[0])
+
+
+app.middleware("http")(count_round_trips_middleware)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+        await db.commit()
 
 
 @app.get("/")
@@ -62,86 +164,564 @@ async def root(request: Request):
     return url_list
 
 
-@app.get("/repo_summary")
-def list_repositories(db: Session = Depends(get_db)):
+def summary(db: Session) -> bytes:
     repos = Project.all_by(db, limit=20)
+    statuses = AuditLog.last_statuses(db, [r.url for r in repos])
     for r in repos:
-        r.status = AuditLog.last_status(r.url, db)
-    return repos
+        r.status = statuses.get(r.url, [])
+    return json.dumps(jsonable_encoder([r.to_dict() for r in repos])).encode()
+
+
+@app.get("/repo_summary")
+async def list_repositories(request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    ## Latest projects with the status of their current run
+    The payload is cached until a project or its audit log changes, clients
+    polling with `If-None-Match` get a `304` meanwhile.
+    """
+    version = await run_in_threadpool(summary_cache.version)
+    headers = {"Cache-Control": "no-cache"}
+    if version is not None:
+        headers["ETag"] = f'W/"{version}"'
+        if request.headers.get("if-none-match") == headers["ETag"]:
+            return Response(status_code=304, headers=headers)
+
+    body = await run_in_threadpool(summary_cache.get, version)
+    if body is None:
+        body = await db.run_sync(summary)
+        await run_in_threadpool(summary_cache.set, version, body)
+    return Response(body, media_type="application/json", headers=headers)
+
 
 @app.get("/repositories")
-def list_all_repositories(db: Session = Depends(get_db)):
-    repos = Project.all(db)
-    result = []
-    for r in repos:
-        r.status = AuditLog.last_status(r.url, db)
-        tr = r.__dict__
-        tr['scancode_report'] = json.loads(r.scancode_report) if r.scancode_report else None
-        result.append(tr)
-    return result
+async def list_all_repositories(
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGINATION_WINDOW, gt=0, le=1000),
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    ## All the projects, newest first
+    Pages of `limit` projects, the next one is linked in the `Link` header.
+    With `stream=true` every project after `cursor` is sent as newline
+    delimited JSON. Only the summary of the scancode report is included, the
+    whole reports are on `/scancode_report` and `/reuse_report`.
+    """
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    if stream:
 
-@app.post("/repository", status_code=HTTP_201_CREATED)
-def create_or_update_a_new_repository(
-    repository: RepoBase, db: Session = Depends(get_db)
+        async def lines():
+            # server side cursor, within the transaction of the request
+            batch = settings.PAGINATION_WINDOW
+            result = await db.stream(
+                Project.page(after=after).execution_options(yield_per=batch)
+            )
+            async for chunk in result.scalars().partitions(batch):
+                await db.run_sync(Project.with_status, chunk)
+                for r in chunk:
+                    yield json.dumps(jsonable_encoder(r.to_dict())) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    def page(db: Session) -> list:
+        repos = db.execute(Project.page(after=after, limit=limit)).scalars().all()
+        return Project.with_status(db, repos)
+
+    repos = await db.run_sync(page)
+    headers = {}
+    if len(repos) == limit:
+        next_page = request.url.include_query_params(
+            cursor=encode_cursor(repos[-1].key)
+        )
+        headers["Link"] = f'<{next_page}>; rel="next"'
+    return JSONResponse(
+        jsonable_encoder([r.to_dict() for r in repos]), headers=headers
+    )
+
+
+@app.get("/search")
+async def search(
+    request: Request,
+    license: Optional[str] = None,
+    holder: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.PAGINATION_WINDOW, gt=0, le=1000),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    ## Creates a new repository
-    If the repo is already existing, it will be updated.
+    ## The projects with files of a license or a copyright holder
+    Either a scancode license key, as `gpl-3.0-only`, or a holder, matched
+    regardless of case, spacing and trailing punctuation. Each project
+    comes with the number of files carrying it in its last scan, the most
+    first, in pages of `limit` linked in the `Link` header.
     """
-    repo = Project.by_url(url=repository.url, db=db)
-    if not repo:
-        repo = Project(url=repository.url)
-        try:
-            repo.clone(db)
-            repo.save(db)
-        except git.exc.GitCommandError as e:
+    if (license is None) == (holder is None):
+        raise HTTPException(
+            status_code=400, detail="Search either a license or a holder"
+        )
+    if license is not None:
+        keys = license_keys(license)
+        if len(keys) != 1:
             raise HTTPException(
-                status_code=206,
-                detail=f"Oops {repository.url} is not a valid git repository",
+                status_code=400, detail=f"Not a license key: {license}"
             )
+        index, [key] = LicenseIndex, keys
     else:
+        index, key = HolderIndex, normalize_holder(holder)
+    try:
+        after = decode_cursor(cursor, int) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = await db.execute(index.search(key, after=after, limit=limit))
+    projects = [dict(url=url, files=files) for url, files in result]
+    headers = {}
+    if len(projects) == limit:
+        last = projects[-1]
+        next_page = request.url.include_query_params(
+            cursor=encode_cursor((last["files"], last["url"]))
+        )
+        headers["Link"] = f'<{next_page}>; rel="next"'
+    return JSONResponse(projects, headers=headers)
+
+
+async def stream_report(db: AsyncSession, column, url: str, media_type: str):
+    id = await db.scalar(select(column).where(Project.url == url))
+    if not id:
+        raise HTTPException(status_code=404, detail="Report not found")
+
+    async def chunks():
+        # a piece of the report in memory at a time
+        result = await db.stream(ReportChunk.read(id).execution_options(yield_per=1))
+        async for data in result.scalars():
+            yield ReportChunk.decompress(data)
+
+    return StreamingResponse(chunks(), media_type=media_type)
+
+
+@app.get("/scancode_report")
+async def scancode_report(url: str, db: AsyncSession = Depends(get_db)):
+    """
+    ## Returns the whole scancode report of the project
+    """
+    return await stream_report(
+        db, Project.scancode_report_id, url, media_type="application/json"
+    )
+
+
+@app.get("/reuse_report")
+async def reuse_report(url: str, db: AsyncSession = Depends(get_db)):
+    """
+    ## Returns the output of the REUSE lint of the project
+    """
+    return await stream_report(db, Project.reuse_report_id, url, media_type="text/plain")
+
+
+@app.get("/stats")
+async def fleet_stats(db: AsyncSession = Depends(get_db)):
+    """
+    ## Totals over every project
+    Projects registered and scanned, the REUSE compliance of the checked
+    ones, the projects notarized on each chain and their share, and how
+    many projects have files of each license key, the most first. Read
+    from counters the scans keep up to date, not from the projects.
+    """
+    counts = {name: int(value) for name, value in await db.execute(Stat.totals())}
+    projects, checked = counts.get("projects", 0), counts.get("reuse_checked", 0)
+    compliant = counts.get("reuse_compliant", 0)
+    notarized = {
+        chain: counts.get(f"notarized:{chain}", 0) for chain, *_ in notary.chains()
+    }
+    licenses = {
+        name.split(":", 1)[1]: value
+        for name, value in counts.items()
+        if name.startswith("license:")
+    }
+    return dict(
+        projects=projects,
+        scanned=counts.get("scanned", 0),
+        reuse=dict(
+            checked=checked,
+            compliant=compliant,
+            compliance_rate=compliant / checked if checked else None,
+        ),
+        notarized={
+            chain: dict(projects=n, coverage=n / projects if projects else None)
+            for chain, n in notarized.items()
+        },
+        licenses=dict(sorted(licenses.items(), key=lambda kv: (-kv[1], kv[0]))),
+    )
+
+
+@app.get("/scancode_cache")
+def scancode_cache():
+    """
+    ## Hits and misses of the per file scancode results cache
+    """
+    return blobcache.stats()
+
+
+@app.get("/notary_stats")
+def notary_stats():
+    """
+    ## Requests, errors and mean latency of the notarization on each chain
+    """
+    return notary.stats()
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    ## Prometheus metrics
+    Of this API process, and of the API and worker processes sharing its
+    PROMETHEUS_MULTIPROC_DIR.
+    """
+    return Response(exposition(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/db_pool")
+def db_pool():
+    """
+    ## Connection pool of this API process
+    Connections in use and how long requests waited to check one out.
+    """
+    pool = get_async_engine().pool
+    return dict(
+        pool_stats.snapshot(),
+        size=pool.size(),
+        checked_out=pool.checkedout(),
+        overflow=pool.overflow(),
+    )
+
+
+def high_water(lane: str) -> int:
+    return {
+        "interactive": settings.INTERACTIVE_HIGH_WATER,
+        "bulk": settings.BULK_HIGH_WATER,
+    }[lane]
+
+
+def backpressure(lane: str):
+    """
+    Turn a new scan of `lane` away with a 429 while the scans ahead of it
+    are past the high-water mark of the lane, until when they should have
+    drained at the rate the workers finish them.
+    """
+    retry_after = lanes.retry_after(lane, high_water(lane))
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many scans waiting, retry in {retry_after}s",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+@app.get("/health")
+def health():
+    """
+    ## Scans waiting, queued and running
+    The scans waiting in each lane, in the broker and running, the scans
+    the workers finished a second lately, and the Retry-After a new
+    interactive or bulk scan would get, null if accepted. 503 while the
+    interactive scans are turned away.
+    """
+    state = dict(
+        waiting=lanes.waiting(),
+        queued=queue_depth(lanes.queue),
+        running=running(),
+        drain_rate=lanes.drain_rate(),
+        retry_after={
+            lane: lanes.retry_after(lane, high_water(lane))
+            for lane in ("interactive", "bulk")
+        },
+    )
+    if state["retry_after"]["interactive"] is not None:
+        return JSONResponse(state, status_code=503)
+    return state
+
+
+@app.post("/repository", status_code=HTTP_201_CREATED)
+async def create_or_update_a_new_repository(
+    repository: RepoBase, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    ## Creates a new repository
+    The repository is validated and scanned by a background task, follow
+    it on /status or /events, an invalid one is unregistered. 429 while
+    too many scans are waiting, see /health.
+    """
+    await run_in_threadpool(backpressure, "interactive")
+    if not await db.run_sync(lambda db: Project.register([repository.url], db)):
         raise HTTPException(
             status_code=206,
             detail=f"{repository.url} was already processed, if repository head changed the results will be updated",
         )
+    await db.commit()
+    task_id, _ = await run_in_threadpool(
+        queue_scan, repository.url, submitter=submitter(request)
+    )
+    repo = await db.run_sync(lambda db: Project.by_url(repository.url, db))
+    return dict(repo.to_dict(), task_id=task_id)
+
+
+@app.post("/repositories/batch", status_code=HTTP_202_ACCEPTED)
+async def register_repositories(
+    batch: RepoBatch, request: Request, db: AsyncSession = Depends(get_db)
+):
+    """
+    ## Registers many repositories at once
+    The new repositories are inserted together and each gets a background
+    validation and scan task, in the bulk lane: the scans of the
+    interactive requests go first, and the submitters of bulk
+    registrations take turns. Returns the task id of each url, null for
+    the urls which were already registered. 429 while too many scans are
+    waiting, see /health.
+    """
+    await run_in_threadpool(backpressure, "bulk")
+    urls = [str(url) for url in batch.urls]
+    new = await db.run_sync(lambda db: Project.register(urls, db))
+    # the scans must find the projects
+    await db.commit()
+
+    def queue():
+        tasks = dict.fromkeys(urls)
+        for url in new:
+            tasks[url], _ = queue_scan(
+                url, lane="bulk", submitter=submitter(request), dispatch=False
+            )
+        dispatch_scans()
+        return tasks
+
+    return await run_in_threadpool(queue)
+
 
-    return repo
+def submitter(request: Request) -> str:
+    """Who the scans of `request` are for, the submitters of a lane take turns"""
+    return request.headers.get("X-Submitter") or request.client.host
+
+
+def queue_scan(
+    url: str,
+    head: Optional[str] = None,
+    lane: str = "interactive",
+    submitter: str = "anonymous",
+    dispatch: bool = True,
+) -> Tuple[str, bool]:
+    """
+    Queue a scan of `url` in `lane` unless one is in flight, its task id
+    either way. Without `dispatch` the scan waits for the next dispatch.
+    """
+    flight = Flight(url)
+    task_id, new = flight.start(head)
+    if new:
+        try:
+            scan = dict(url=url, head=head, task_id=task_id, queued=time.time())
+            lanes.push(lane, submitter, scan)
+        except Exception:
+            flight.release(task_id)
+            raise
+        if dispatch:
+            dispatch_scans()
+    return task_id, new
+
+
+LANES_BY_PRIORITY = {priority: lane for lane, priority in PRIORITY.items()}
+
+
+def send_scan(scan: dict, priority: int) -> bool:
+    # a scan which waited past its lease may have been queued again since
+    if not Flight(scan["url"]).resume(scan["task_id"]):
+        return False
+    scan_task.apply_async(
+        (scan["url"], scan["head"], scan.get("queued")),
+        task_id=scan["task_id"],
+        priority=priority,
+    )
+    return True
+
+
+def dispatch_scans() -> int:
+    return lanes.dispatch(send_scan)
+
+
+@celery.task
+def dispatch_task():
+    """Hand the broker the scans waiting in the lanes"""
+    dispatch_scans()
+
+
+@celery.task(bind=True)
+def scan_task(self, url, head=None, queued=None):
+    if queued and not self.request.retries:
+        priority = (self.request.delivery_info or {}).get("priority")
+        lane = LANES_BY_PRIORITY.get(priority, "none")
+        QUEUE_WAIT_SECONDS.labels(lane).observe(time.time() - queued)
+    # the scan leaves room in the broker for the next one
+    dispatch_scans()
+    flight = Flight(url)
+    db = SessionLocal()
+    repo = None
+    retrying = False
+    try:
+        with flight.hold(self.request.id):
+            repo = Project.by_url(url, db)
+            if not repo:
+                return
+            if head is None:
+                try:
+                    head = probe(url)
+                except RepositoryNotFound:
+                    if repo.hash is None:
+                        celery_log.warning(
+                            "%s is not a valid git repository, unregistering it", url
+                        )
+                        repo.delete(db)
+                        repo = None
+                        return
+                except Unreachable as e:
+                    retrying = self.request.retries < self.max_retries
+                    raise self.retry(exc=e)
+            if head:
+                flight.hash(self.request.id, head)
+            repo.scan(db, head=head)
+    finally:
+        db.close()
+        if retrying:
+            # unreachable for now, the lease waits for the retry
+            flight.renew(self.request.id, flight.ttl)
+        else:
+            lanes.finished()
+            again = flight.release(self.request.id)
+            if again and repo and again != repo.hash:
+                queue_scan(url, again, lane="refresh", submitter="refresh")
+
+
+@celery.task
+def refresh_task(urls):
+    """
+    Probe the remote HEAD of many projects at once, scan the changed ones
+    in the refresh lane and mark the others as up to date.
+    """
+    db = SessionLocal()
+    try:
+        heads = remote_heads(urls)
+        for url, head in heads.items():
+            repo = Project.by_url(url, db)
+            if head and repo and not repo.unchanged(head):
+                queue_scan(
+                    url, head, lane="refresh", submitter="refresh", dispatch=False
+                )
+        # the scans save the changed ones again, the unreachable ones wait
+        # for their turn like the others
+        Project.touch(urls, db)
+    finally:
+        db.close()
+    dispatch_scans()
 
 
 @celery.task
-def scan_task(url):
-    db = next(get_db())
-    repo = Project.by_url(url, db)
-    repo.scan(db)
+def refresh_all_task():
+    """
+    Probe the projects not updated for REFRESH_MAX_AGE, the longest first
+    and no more than REFRESH_BUDGET an hour, REFRESH_BATCH urls per
+    refresh task. Drop the reports left without a project.
+    """
+    budget = settings.REFRESH_BUDGET * settings.REFRESH_INTERVAL // 3600
+    db = SessionLocal()
+    try:
+        urls = Project.stale(db, settings.REFRESH_MAX_AGE, budget)
+        ReportChunk.collect(db)
+    finally:
+        db.close()
+    for i in range(0, len(urls), settings.REFRESH_BATCH):
+        refresh_task.delay(urls[i : i + settings.REFRESH_BATCH])
 
 
 @app.post("/scan", status_code=HTTP_202_ACCEPTED)
 async def scan(
     repository: RepoBase,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_db),
 ):
     """
     ## Queue a scan of the project into a background task.
+    A scan of the project already queued or running is not started twice,
+    the request gets the task id of the one in flight. The scan goes
+    ahead of the bulk registrations and the scheduled refreshes. 429
+    while too many scans are waiting, see /health.
     """
-    repo = Project.by_url(repository.url, db)
+    repo = await db.run_sync(lambda db: Project.by_url(repository.url, db))
     if not repo:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    scan_task.delay(repository.url)
-    return {"message": "Scan queued visit the status on /status"}
+    await run_in_threadpool(backpressure, "interactive")
+    task_id, new = await run_in_threadpool(
+        queue_scan, repository.url, submitter=submitter(request)
+    )
+    if not new:
+        return {
+            "message": "Scan already in flight visit the status on /status",
+            "task_id": task_id,
+        }
+    return {"message": "Scan queued visit the status on /status", "task_id": task_id}
 
 
 @app.post("/status")
-def status(repository: RepoBase, db: Session = Depends(get_db)):
+async def status(repository: RepoBase, db: AsyncSession = Depends(get_db)):
     """
     ## Returns the status of the project.
     """
-    repo = Project.by_url(repository.url, db)
+    repo = await db.run_sync(lambda db: Project.by_url(repository.url, db))
     if not repo:
         raise HTTPException(status_code=404, detail="Repository not found")
 
-    return repo.logs(db)
+    return await db.run_sync(repo.logs)
+
+
+@app.get("/events")
+async def events(
+    request: Request,
+    url: Optional[str] = None,
+    last_event_id: Optional[int] = Header(None),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    ## Stream the state transitions of the scans as Server-Sent Events
+    Of all the projects, or only of `url`. Clients reconnecting with
+    `Last-Event-ID` first get the transitions they missed, at most the
+    latest `EVENTS_REPLAY_LIMIT` of them: clients further behind should
+    reload `/repo_summary`.
+    """
+
+    async def stream():
+        async with bus.subscribe(url) as subscription:
+            seen, missed = 0, []
+            if last_event_id is not None:
+                missed = await db.run_sync(
+                    lambda db: AuditLog.since(last_event_id, db, url)
+                )
+            # the stream lasts, its connection goes back to the pool now
+            await db.close()
+            for log in missed:
+                seen = log.id
+                yield format_event(log.event())
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=settings.EVENTS_HEARTBEAT)
+                if event is None:
+                    yield ": heartbeat\n\n"
+                elif event["id"] > seen:
+                    yield format_event(event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 def start():
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import redis
+from sqlalchemy import Column, DateTime, String, Text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import broker
+from .budget import cpu
+from .config import settings
+from .database import Base
+from .metrics import REPOSITORY_BYTES, REPOSITORY_FILES
+from .reports import Index, summarize
+from .scanners import OPTIONS, scanners
+
+L = logging.getLogger("uvicorn.error")
+
+COUNTERS = "softwarepassport:scancode_cache"
+CHUNK = 500
+REGULAR_FILES = ("100644", "100755")
+
+
+@lru_cache()
+def options_key() -> str:
+    """Results are reused only for the same scancode options and version"""
+    from scancode_config import __version__ as scancode_version
+
+    return hashlib.sha1(
+        json.dumps([OPTIONS, scancode_version], sort_keys=True).encode()
+    ).hexdigest()
+
+
+class ScancodeBlob(Base):
+    """Scancode result of a single file, keyed by its git blob sha"""
+
+    __tablename__ = "scancode_blobs"
+
+    sha = Column(String, primary_key=True)
+    options = Column(String, primary_key=True)
+    result = Column(Text)
+    date_last_used = Column(DateTime, default=datetime.utcnow, index=True)
+
+    @classmethod
+    def known(cls, shas: Iterable[str], db: Session) -> Set[str]:
+        """The `shas` with a result"""
+        shas = list(shas)
+        found = set()
+        for i in range(0, len(shas), CHUNK):
+            found.update(
+                sha
+                for sha, in db.query(cls.sha).filter(
+                    cls.options == options_key(), cls.sha.in_(shas[i : i + CHUNK])
+                )
+            )
+        return found
+
+    @classmethod
+    def get_many(cls, shas: Iterable[str], db: Session) -> Dict[str, dict]:
+        shas = list(shas)
+        now = datetime.utcnow()
+        found = {}
+        for i in range(0, len(shas), CHUNK):
+            chunk = shas[i : i + CHUNK]
+            rows = (
+                db.query(cls.sha, cls.result, cls.date_last_used)
+                .filter(cls.options == options_key(), cls.sha.in_(chunk))
+                .all()
+            )
+            found.update((r.sha, json.loads(r.result)) for r in rows)
+            # refresh the LRU clock at most daily, hits stay read only
+            stale = [r.sha for r in rows if r.date_last_used < now - timedelta(days=1)]
+            if stale:
+                db.query(cls).filter(
+                    cls.options == options_key(), cls.sha.in_(stale)
+                ).update({cls.date_last_used: now}, synchronize_session=False)
+        return found
+
+    @classmethod
+    def put_many(cls, results: Dict[str, dict], db: Session):
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        now = datetime.utcnow()
+        rows = [
+            dict(sha=sha, options=options_key(), result=json.dumps(r), date_last_used=now)
+            for sha, r in results.items()
+        ]
+        for i in range(0, len(rows), CHUNK):
+            db.execute(
+                dialect.insert(cls).values(rows[i : i + CHUNK]).on_conflict_do_nothing()
+            )
+
+    @classmethod
+    def evict(cls, db: Session, max_age: int = settings.SCANCODE_CACHE_MAX_AGE):
+        """Drop the results not used in the last `max_age` days"""
+        cutoff = datetime.utcnow() - timedelta(days=max_age)
+        deleted = (
+            db.query(cls)
+            .filter(cls.date_last_used < cutoff)
+            .delete(synchronize_session=False)
+        )
+        L.info("Evicted %d scancode results unused since %s", deleted, cutoff)
+
+
+def set_from_file(result, path: str):
+    """Point the license matches of a cached result to `path`"""
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if key == "from_file":
+                result[key] = path
+            else:
+                set_from_file(value, path)
+    elif isinstance(result, list):
+        for value in result:
+            set_from_file(value, path)
+
+
+def blobs(path: str) -> Dict[str, str]:
+    """Git blob sha of every regular file of the checkout, by path"""
+    import git
+
+    found = {}
+    for entry in git.Repo(path).git.ls_files("-s", "-z").split("\0"):
+        if not entry:
+            continue
+        meta, name = entry.split("\t", 1)
+        mode, sha, _ = meta.split()
+        if mode in REGULAR_FILES:
+            found[name] = sha
+    return found
+
+
+def stats() -> dict:
+    try:
+        hits, misses = broker.get_redis().hmget(COUNTERS, "hits", "misses")
+    except redis.RedisError:
+        return {}
+    hits, misses = int(hits or 0), int(misses or 0)
+    return dict(
+        hits=hits,
+        misses=misses,
+        hit_rate=hits / (hits + misses) if hits + misses else None,
+    )
+
+
+def split(path: str, names: Iterable[str], n: int) -> List[List[str]]:
+    """`names` in at most `n` chunks of about the same size in bytes"""
+    sizes = {name: os.path.getsize(os.path.join(path, name)) for name in names}
+    chunks = [[] for _ in range(min(n, len(sizes)))]
+    totals = [0] * len(chunks)
+    for name in sorted(sizes, key=sizes.get, reverse=True):
+        i = totals.index(min(totals))
+        chunks[i].append(name)
+        totals[i] += sizes[name]
+    return chunks
+
+
+def scan_blobs(path: str, files: Dict[str, str], n: int) -> Dict[str, dict]:
+    """Scan the files at `path` whose relative paths are `files` keys"""
+    start = time.perf_counter()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        chunks = []
+        for i, names in enumerate(split(path, files, n)):
+            chunk = os.path.join(tmp, str(i))
+            for name in names:
+                os.makedirs(os.path.dirname(os.path.join(chunk, name)), exist_ok=True)
+                shutil.copyfile(os.path.join(path, name), os.path.join(chunk, name))
+            chunks.append(chunk)
+        scanned, seconds = scanners.scan(chunks)
+    L.info(
+        "Scanned %d files in %d chunks: %.2fs setup, %.2fs scan",
+        len(files),
+        len(chunks),
+        time.perf_counter() - start - seconds,
+        seconds,
+    )
+    for f in scanned:
+        if f["type"] != "file":
+            continue
+        result = {k: v for k, v in f.items() if k != "path"}
+        set_from_file(result, None)
+        results[files[f["path"]]] = result
+    return results
+
+
+def scan(
+    path: str, db: Session, report: str, n: Optional[int] = None
+) -> Tuple[dict, Index]:
+    """
+    Write the consolidated scancode report of a checkout to the file
+    `report`, its summary and search index. Scancode runs only on the blobs without a
+    cached result, with up to `n` processes out of the CPU budget
+    (`SCANCODE_PROCESSES` by default).
+
+    The results go through the worker SCANCODE_BATCH files at a time, to
+    the cache as they are scanned then to a spool file of every file of
+    the checkout, which is consolidated into the report out of process.
+    The index is built along the way.
+    """
+    by_path = blobs(path)
+    REPOSITORY_FILES.observe(len(by_path))
+    REPOSITORY_BYTES.observe(
+        sum(os.lstat(os.path.join(path, name)).st_size for name in by_path)
+    )
+    first = {}
+    for name, sha in sorted(by_path.items()):
+        first.setdefault(sha, name)
+    shas = sorted(first)
+    scanned, failed = set(), {}
+    for i in range(0, len(shas), settings.SCANCODE_BATCH):
+        batch = shas[i : i + settings.SCANCODE_BATCH]
+        known = ScancodeBlob.known(batch, db)
+        missing = {first[sha]: sha for sha in batch if sha not in known}
+        if not missing:
+            continue
+        with cpu.acquire(n or settings.SCANCODE_PROCESSES) as granted:
+            results = scan_blobs(path, missing, granted)
+        # files which failed to scan are reported but scanned again next time
+        ScancodeBlob.put_many(
+            {sha: r for sha, r in results.items() if not r.get("scan_errors")}, db
+        )
+        failed.update((sha, r) for sha, r in results.items() if r.get("scan_errors"))
+        scanned.update(missing.values())
+
+    misses = sum(1 for sha in by_path.values() if sha in scanned)
+    hits = len(by_path) - misses
+    try:
+        pipe = broker.get_redis().pipeline(transaction=False)
+        pipe.hincrby(COUNTERS, "hits", hits)
+        pipe.hincrby(COUNTERS, "misses", misses)
+        pipe.set(f"{COUNTERS}:evict", 1, ex=3600, nx=True)
+        evict = pipe.execute()[-1]
+    except redis.RedisError:
+        evict = False
+    L.info("Scancode cache: %d files cached, %d scanned", hits, misses)
+
+    index = Index()
+    with tempfile.NamedTemporaryFile("w", suffix=".json") as assembled:
+        assembled.write('{"files": [')
+        names = sorted(by_path)
+        count = 0
+        for i in range(0, len(names), settings.SCANCODE_BATCH):
+            batch = names[i : i + settings.SCANCODE_BATCH]
+            batch_shas = {by_path[name] for name in batch}
+            results = ScancodeBlob.get_many(batch_shas, db)
+            results.update((sha, failed[sha]) for sha in batch_shas & failed.keys())
+            for name in batch:
+                result = results.get(by_path[name])
+                if result is None:
+                    continue
+                set_from_file(result, name)
+                index.add(result)
+                assembled.write(", " if count else "")
+                json.dump(dict(result, path=name), assembled)
+                count += 1
+        assembled.write("]}")
+        assembled.flush()
+
+        if evict:
+            ScancodeBlob.evict(db)
+        if not count:
+            empty = dict(files=[], consolidated_components=[])
+            with open(report, "w") as f:
+                json.dump(empty, f)
+            return summarize(empty), index
+        with cpu.acquire():
+            return scanners.consolidate(assembled.name, report), index
@@ -0,0 +1,17 @@
+from functools import lru_cache
+
+import redis
+from redis import asyncio as aioredis
+
+from .config import settings
+
+
+@lru_cache()
+def get_redis() -> redis.Redis:
+    """Client of the Celery broker, shared by the API and the workers"""
+    return redis.Redis.from_url(settings.CELERY_BROKER)
+
+
+def get_async_redis() -> aioredis.Redis:
+    """Client bound to the running event loop, close it when done"""
+    return aioredis.Redis.from_url(settings.CELERY_BROKER)
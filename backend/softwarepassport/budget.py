@@ -0,0 +1,74 @@
+import fcntl
+import logging
+import os
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Iterator, List
+
+from .config import settings
+
+L = logging.getLogger("uvicorn.error")
+
+
+class CpuBudget:
+    """
+    Cores shared by the CPU bound stages of every worker of the host.
+
+    Each core is a slot file, a stage holds the slots it was granted
+    flock'ed while it runs. A stage asking for `want` cores waits for a
+    first one and takes as many of the others as are free at that
+    moment, so scancode gets fewer processes under load instead of the
+    host running one pool per worker thread.
+    """
+
+    def __init__(
+        self,
+        root: str = settings.CPU_BUDGET_DIR,
+        cores: int = settings.CPU_BUDGET,
+        poll: float = 0.05,
+    ):
+        self.root = Path(root)
+        self.cores = max(cores, 1)
+        self.poll = poll
+
+    def slots(self) -> List[Path]:
+        self.root.mkdir(parents=True, exist_ok=True)
+        return [self.root / f"core-{i}.lock" for i in range(self.cores)]
+
+    def try_slot(self, stack: ExitStack, slot: Path) -> bool:
+        # every open file is locked on its own, threads contend like processes
+        f = open(slot, "w")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            f.close()
+            return False
+        stack.enter_context(f)
+        stack.callback(fcntl.flock, f, fcntl.LOCK_UN)
+        return True
+
+    @contextmanager
+    def acquire(self, want: int = 1) -> Iterator[int]:
+        """Hold up to `want` cores, yields how many were granted"""
+        start = time.perf_counter()
+        slots = self.slots()
+        with ExitStack() as stack:
+            granted = 0
+            while not granted:
+                for slot in slots:
+                    if granted == want:
+                        break
+                    granted += self.try_slot(stack, slot)
+                if not granted:
+                    time.sleep(self.poll)
+            L.info(
+                "Granted %d of %d cores after %.2fs",
+                granted,
+                want,
+                time.perf_counter() - start,
+            )
+            yield granted
+
+
+cpu = CpuBudget()
@@ -0,0 +1,70 @@
+import logging
+from typing import Optional
+from uuid import uuid4
+
+import redis
+
+from . import broker
+from .config import settings
+
+L = logging.getLogger("uvicorn.error")
+
+
+class VersionedCache:
+    """
+    Cache of a rendered payload, valid as long as its version does not change.
+
+    Writers only `bump` the version, readers compare it with the one of the
+    cached payload, so an idle cache costs a single Redis GET per read.
+    Versions are random tokens, a lost version key can never bring back a
+    payload rendered before.
+    """
+
+    def __init__(self, name: str, ttl: int = settings.SUMMARY_CACHE_TTL):
+        self.key = f"softwarepassport:{name}"
+        self.ttl = ttl
+        self._payload = (None, None)
+
+    def version(self) -> Optional[str]:
+        redis_ = broker.get_redis()
+        try:
+            version = redis_.get(f"{self.key}:version")
+            if version is None:
+                redis_.set(f"{self.key}:version", uuid4().hex, nx=True)
+                version = redis_.get(f"{self.key}:version")
+            return version.decode()
+        except redis.RedisError as e:
+            L.warning("Cache %s unavailable: %s", self.key, e)
+            return None
+
+    def bump(self):
+        try:
+            broker.get_redis().set(f"{self.key}:version", uuid4().hex)
+        except redis.RedisError as e:
+            L.warning("Failed to invalidate cache %s: %s", self.key, e)
+
+    def get(self, version: Optional[str]) -> Optional[bytes]:
+        if version is None:
+            return None
+        cached_version, payload = self._payload
+        if cached_version == version:
+            return payload
+        try:
+            payload = broker.get_redis().get(f"{self.key}:{version}")
+        except redis.RedisError:
+            return None
+        if payload is not None:
+            self._payload = (version, payload)
+        return payload
+
+    def set(self, version: Optional[str], payload: bytes):
+        if version is None:
+            return
+        self._payload = (version, payload)
+        try:
+            broker.get_redis().set(f"{self.key}:{version}", payload, ex=self.ttl)
+        except redis.RedisError as e:
+            L.warning("Failed to store cache %s: %s", self.key, e)
+
+
+summary_cache = VersionedCache("repo_summary")
@@ -1,3 +1,5 @@
+import os
+import tempfile
 from typing import Optional, Dict, Any
 from pydantic import (
     BaseSettings,
@@ -32,6 +34,11 @@ class Settings(BaseSettings):
             path=f"/{values.get('POSTGRES_DB') or ''}",
         )
 
+    # connection pool of each API process
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+
     HOST: IPvAnyAddress = "0.0.0.0"
     PORT: int = 8000
     WORKERS: int = 14
@@ -39,9 +46,75 @@ class Settings(BaseSettings):
     FABRIC: HttpUrl = "https://apiroom.net/api/zenbridge/fabric-write"
     ETHEREUM: HttpUrl = "https://apiroom.net/api/zenbridge/ethereum-write"
     PLANETMINT: HttpUrl = "https://apiroom.net/api/zenbridge/planetmint-write"
+    NOTARY_TIMEOUT: int = 10
+    NOTARY_RETRIES: int = 3
+    NOTARY_BACKOFF: float = 0.5
+    NOTARY_POOL_SIZE: int = 16
     PAGINATION_WINDOW: int = 100
+    REGISTER_BATCH_LIMIT: int = 10000
     CELERY_BROKER: RedisDsn = "redis://127.0.0.1:6379/0"
     CELERY_BACKEND: RedisDsn = "redis://127.0.0.1:6379/0"
+    SUMMARY_CACHE_TTL: int = 3600
+    EVENTS_HEARTBEAT: int = 15
+    EVENTS_REPLAY_LIMIT: int = 1000
+    MIRROR_CACHE_DIR: str = os.path.join(tempfile.gettempdir(), "softwarepassport-mirrors")
+    MIRROR_CACHE_SIZE: int = 10 * 1024**3
+    LS_REMOTE_TIMEOUT: int = 30
+    LS_REMOTE_CONCURRENCY: int = 16
+    # seconds between two runs of the refresh scheduler, the most projects
+    # it probes per hour, the age in seconds of the last update of a project
+    # past which it is probed, and the most urls a single refresh task probes
+    REFRESH_INTERVAL: int = 3600
+    REFRESH_BUDGET: int = 1000
+    REFRESH_MAX_AGE: int = 24 * 3600
+    REFRESH_BATCH: int = 500
+    # scans handed to the broker at once, the others wait in their lane,
+    # and the seconds between two dispatches besides the ones of the scans
+    SCAN_QUEUE_DEPTH: int = 32
+    SCAN_DISPATCH_INTERVAL: int = 30
+    # scans waiting ahead of a new interactive or bulk one past which the
+    # API answers 429, the minutes the drain rate of the scans is measured
+    # over and the longest Retry-After it derives from it
+    INTERACTIVE_HIGH_WATER: int = 500
+    BULK_HIGH_WATER: int = 50000
+    DRAIN_WINDOW: int = 10
+    RETRY_AFTER_MAX: int = 3600
+    # days a cached per file scancode result survives without being used
+    SCANCODE_CACHE_MAX_AGE: int = 90
+    # cores the CPU bound stages of all the workers of a host share, and
+    # the most scancode processes a single scan asks for
+    CPU_BUDGET: int = os.cpu_count() or 1
+    CPU_BUDGET_DIR: str = os.path.join(tempfile.gettempdir(), "softwarepassport-cpu")
+    SCANCODE_PROCESSES: int = 4
+    # warm scancode processes of each worker, and the longest a chunk of
+    # files may take to scan
+    SCANNER_POOL_SIZE: int = os.cpu_count() or 1
+    SCANNER_TIMEOUT: int = 3600
+    # what a scan holds in the worker: the files scanned or assembled at
+    # once, the bytes of the report read at once to store it, and the
+    # memory the consolidation of the report may take on top of the worker
+    SCANCODE_BATCH: int = 1000
+    REPORT_CHUNK_SIZE: int = 1024**2
+    SCANCODE_MEMORY_LIMIT: int = 4 * 1024**3
+    # zstd level of the stored reports, and the days a report no project
+    # references any more is kept
+    REPORT_COMPRESSION_LEVEL: int = 3
+    REPORT_MAX_AGE: int = 7
+    # rows every fleet wide counter is spread over, the scans saving at once
+    # seldom update the same one
+    STATS_SLOTS: int = 16
+    # longest a queued scan holds its lease, duplicates start a new scan
+    # after. A running scan renews it every SCAN_LEASE_HEARTBEAT seconds,
+    # the lease of a dead worker expires after three missed renewals
+    SCAN_LEASE_TTL: int = 2 * 3600
+    SCAN_LEASE_HEARTBEAT: int = 60
+    # port of the Prometheus exporter of each worker, none without. The
+    # share of the tasks profiled by sampling the stacks of the worker every
+    # PROFILE_INTERVAL seconds into PROFILE_DIR, none by default
+    WORKER_METRICS_PORT: Optional[int] = None
+    PROFILE_RATE: float = 0.0
+    PROFILE_INTERVAL: float = 0.01
+    PROFILE_DIR: str = os.path.join(tempfile.gettempdir(), "softwarepassport-profiles")
 
     class Config:
         env_file = ".env"
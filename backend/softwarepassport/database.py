@@ -1,11 +1,18 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import declarative_base, sessionmaker, scoped_session
-from sqlalchemy.pool import NullPool
+from sqlalchemy.orm import Session, declarative_base, sessionmaker, scoped_session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
 
 from .config import settings
 
+# the workers, a connection per task
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
@@ -14,3 +21,94 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(bind=engine, autocommit=True)
 Base = declarative_base()
+
+DRIVERS = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """`url` with the asyncio driver of its database"""
+    scheme, rest = str(url).split("://", 1)
+    dialect = scheme.split("+")[0]
+    return f"{dialect}+{DRIVERS[dialect]}://{rest}"
+
+
+class PoolStats:
+    """Checkouts of the pools of the process and how long they waited"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        with self.lock:
+            self.checkouts += 1
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return dict(
+                checkouts=self.checkouts,
+                mean_wait_seconds=self.seconds / self.checkouts
+                if self.checkouts
+                else None,
+                max_wait_seconds=self.max_seconds,
+            )
+
+
+pool_stats = PoolStats()
+
+
+class TimedPool(AsyncAdaptedQueuePool):
+    """Bounded pool recording the time spent getting each connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_stats.record(time.perf_counter() - start)
+
+
+def create_api_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        async_url(url),
+        poolclass=TimedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_pre_ping=True,
+    )
+
+
+@lru_cache()
+def get_async_engine() -> AsyncEngine:
+    """
+    Engine of the API process, its sessions share a bounded pool and never
+    block the event loop. Built on first use, the workers keep to the sync
+    engine and never load the asyncio drivers.
+    """
+    return create_api_engine(settings.DATABASE_URL)
+
+
+def AsyncSessionLocal() -> AsyncSession:
+    return AsyncSession(bind=get_async_engine(), expire_on_commit=False)
+
+
+@contextmanager
+def sibling(db: Session):
+    """Session configured like `db`, for work running in another thread"""
+    other = Session(
+        bind=db.get_bind(),
+        autocommit=db.autocommit,
+        autoflush=db.autoflush,
+        expire_on_commit=db.expire_on_commit,
+    )
+    try:
+        yield other
+        if other.in_transaction():
+            other.commit()
+    finally:
+        other.close()
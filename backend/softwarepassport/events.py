@@ -0,0 +1,81 @@
+import asyncio
+import json
+import logging
+from typing import Optional
+
+import redis
+
+from . import broker
+
+L = logging.getLogger("uvicorn.error")
+
+CHANNEL = "softwarepassport:events"
+
+
+def channel(url: Optional[str] = None) -> str:
+    return f"{CHANNEL}:{url}" if url else CHANNEL
+
+
+def format_event(event: dict) -> str:
+    return f"id: {event['id']}\ndata: {json.dumps(event)}\n\n"
+
+
+class Subscription:
+    """
+    Live events of a single project, or of all of them when `url` is None.
+
+    Use it as an async context manager so the subscription is in place
+    before replaying the audit log, then `get` the events one by one.
+    """
+
+    def __init__(self, url: Optional[str] = None):
+        self.url = url
+
+    async def __aenter__(self):
+        self.client = broker.get_async_redis()
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        await self.pubsub.subscribe(channel(self.url))
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.pubsub.unsubscribe()
+        await self.pubsub.close()
+        await self.client.close()
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """Next event, None if nothing was published within `timeout`"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # subscription confirmations are skipped returning None early
+            message = await self.pubsub.get_message(
+                timeout=max(deadline - loop.time(), 0)
+            )
+            if message:
+                return json.loads(message["data"])
+            if loop.time() >= deadline:
+                return None
+
+
+class EventBus:
+    """
+    Fan out of the `State` transitions written by the workers through the
+    pub/sub of the broker, on a channel for all the projects and on one
+    per project.
+    """
+
+    def subscribe(self, url: Optional[str] = None) -> Subscription:
+        return Subscription(url)
+
+    def publish(self, event: dict):
+        payload = json.dumps(event)
+        try:
+            pipe = broker.get_redis().pipeline(transaction=False)
+            pipe.publish(channel(), payload)
+            pipe.publish(channel(event["url"]), payload)
+            pipe.execute()
+        except redis.RedisError as e:
+            L.warning("Failed to publish event %s: %s", event["id"], e)
+
+
+bus = EventBus()
@@ -0,0 +1,138 @@
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from uuid import uuid4
+
+import redis
+
+from . import broker
+from .config import settings
+
+L = logging.getLogger("uvicorn.error")
+
+# the scans running, scored by the expiry of their lease
+RUNNING = "softwarepassport:scans:running"
+
+
+def running() -> int:
+    """Scans running on the workers, those of dead ones soon drop out"""
+    redis_ = broker.get_redis()
+    now = time.time()
+    redis_.zremrangebyscore(RUNNING, "-inf", now)
+    return redis_.zcard(RUNNING)
+
+
+class Flight:
+    """
+    Lease on the scan of a project, at most one scan per url is in flight.
+
+    The lease holds the Celery task id of the scan, a request for a url
+    with a scan in flight attaches to it and gets that id back. Once the
+    commit being scanned is known it is recorded along the lease, a
+    request for another commit then asks the running scan to go again
+    when it is done instead of starting a concurrent one.
+
+    A queued scan holds the lease for `ttl`, a running one renews it
+    every `heartbeat` so the lease of a dead worker is soon released.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        ttl: int = settings.SCAN_LEASE_TTL,
+        heartbeat: float = settings.SCAN_LEASE_HEARTBEAT,
+    ):
+        self.url = url
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.key = f"softwarepassport:scan:{hashlib.sha1(url.encode()).hexdigest()}"
+
+    def start(self, head: Optional[str] = None) -> Tuple[str, bool]:
+        """Task id of the scan in flight, and whether it is a new one"""
+        redis_ = broker.get_redis()
+        task_id = uuid4().hex
+        while True:
+            if redis_.set(self.key, task_id, nx=True, ex=self.ttl):
+                return task_id, True
+            running, hash_ = redis_.mget(self.key, f"{self.key}:hash")
+            if running is None:
+                # released in the meantime
+                continue
+            if head and hash_ and hash_.decode() != head:
+                redis_.set(f"{self.key}:again", head, ex=self.ttl)
+            L.info("Scan of %s already in flight as %s", self.url, running.decode())
+            return running.decode(), False
+
+    def hash(self, task_id: str, head: str):
+        """Record the commit the scan `task_id` is working on"""
+        redis_ = broker.get_redis()
+        if redis_.get(self.key) == task_id.encode():
+            redis_.set(f"{self.key}:hash", head, ex=self.ttl)
+
+    def release(self, task_id: str) -> Optional[str]:
+        """End the scan `task_id`, the commit to scan next if one was asked"""
+        with broker.get_redis().pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != task_id.encode():
+                    return None
+                pipe.multi()
+                pipe.get(f"{self.key}:again")
+                pipe.delete(self.key, f"{self.key}:hash", f"{self.key}:again")
+                again, _ = pipe.execute()
+            except redis.WatchError:
+                return None
+        return again.decode() if again else None
+
+    def renew(self, task_id: str, ttl: int) -> bool:
+        """Expire the lease of `task_id` in `ttl` seconds, False if it lost it"""
+        with broker.get_redis().pipeline() as pipe:
+            try:
+                pipe.watch(self.key)
+                if pipe.get(self.key) != task_id.encode():
+                    return False
+                pipe.multi()
+                for key in [self.key, f"{self.key}:hash", f"{self.key}:again"]:
+                    pipe.expire(key, ttl)
+                pipe.execute()
+            except redis.WatchError:
+                return False
+        return True
+
+    def resume(self, task_id: str) -> bool:
+        """
+        Hold the lease of the waiting scan `task_id` for another `ttl` as a
+        worker is about to get it, taking it back if it expired meanwhile.
+        False if another scan of the url holds it.
+        """
+        if self.renew(task_id, self.ttl):
+            return True
+        return bool(broker.get_redis().set(self.key, task_id, nx=True, ex=self.ttl))
+
+    @contextmanager
+    def hold(self, task_id: str) -> Iterator[None]:
+        """Keep the lease of the running scan `task_id` alive meanwhile"""
+        ttl = int(3 * self.heartbeat) or 1
+        redis_ = broker.get_redis()
+        self.renew(task_id, ttl)
+        redis_.zadd(RUNNING, {task_id: time.time() + ttl})
+        done = threading.Event()
+
+        def beat():
+            while not done.wait(self.heartbeat):
+                if not self.renew(task_id, ttl):
+                    L.warning("Scan %s of %s lost its lease", task_id, self.url)
+                    return
+                redis_.zadd(RUNNING, {task_id: time.time() + ttl})
+
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            done.set()
+            thread.join()
+            redis_.zrem(RUNNING, task_id)
@@ -0,0 +1,141 @@
+import json
+import logging
+import math
+import time
+from typing import Callable, Dict, Optional
+
+from . import broker
+from .config import settings
+
+L = logging.getLogger("uvicorn.error")
+
+# served in this order, and the broker priority of their scans (0 first)
+LANES = ["interactive", "bulk", "refresh"]
+PRIORITY = {"interactive": 0, "bulk": 5, "refresh": 9}
+# Redis transport options of the broker: every priority in a list of its
+# own, `<queue>:<priority>`, the workers draining the higher ones first
+TRANSPORT_OPTIONS = {
+    "priority_steps": list(range(10)),
+    "sep": ":",
+    "queue_order_strategy": "priority",
+}
+
+
+def queue_depth(queue: str) -> int:
+    """Messages waiting in the broker `queue`, all priorities"""
+    pipe = broker.get_redis().pipeline(transaction=False)
+    for priority in TRANSPORT_OPTIONS["priority_steps"]:
+        pipe.llen(f"{queue}{TRANSPORT_OPTIONS['sep']}{priority}" if priority else queue)
+    return sum(pipe.execute())
+
+
+class Lanes:
+    """
+    Scans waiting for a worker, in a lane per kind of request.
+
+    The scans are kept out of the broker, which only ever holds `depth`
+    of them, the lanes fill it back as the workers take them: the
+    interactive lane first, then the bulk registrations, then the
+    scheduled refreshes. Within a lane the submitters take turns, one scan
+    each, so a large import does not hold back the scans of the others.
+
+    A lane is a ring of the submitters with scans waiting, and a list of
+    the scans of each submitter. The lanes count the scans waiting in
+    each, and the scans finished every minute for the drain rate.
+    """
+
+    def __init__(self, queue: str = "heavy", depth: int = settings.SCAN_QUEUE_DEPTH):
+        self.queue = queue
+        self.depth = depth
+        self.key = f"softwarepassport:lanes:{queue}"
+
+    def push(self, lane: str, submitter: str, scan: dict):
+        redis_ = broker.get_redis()
+        redis_.hincrby(f"{self.key}:waiting", lane, 1)
+        # the first scan of the submitter gives them a turn
+        if redis_.rpush(f"{self.key}:{lane}:{submitter}", json.dumps(scan)) == 1:
+            redis_.rpush(f"{self.key}:{lane}", submitter)
+
+    def pop(self, lane: str) -> Optional[dict]:
+        """Next scan of `lane`, the one of the submitter whose turn it is"""
+        redis_ = broker.get_redis()
+        while True:
+            submitter = redis_.lpop(f"{self.key}:{lane}")
+            if submitter is None:
+                return None
+            scans = f"{self.key}:{lane}:{submitter.decode()}"
+            # a push in between either sees the scans left or gives the turn
+            with redis_.pipeline() as pipe:
+                scan, left = pipe.lpop(scans).llen(scans).execute()
+            if left:
+                redis_.rpush(f"{self.key}:{lane}", submitter)
+            if scan is not None:
+                redis_.hincrby(f"{self.key}:waiting", lane, -1)
+                return json.loads(scan)
+
+    def waiting(self) -> Dict[str, int]:
+        """Scans waiting in each lane"""
+        counts = broker.get_redis().hgetall(f"{self.key}:waiting")
+        return {lane: int(counts.get(lane.encode(), 0)) for lane in LANES}
+
+    def ahead(self, lane: str) -> int:
+        """Scans a new one of `lane` would wait for, in the lanes and the broker"""
+        waiting = self.waiting()
+        lanes = LANES[: LANES.index(lane) + 1]
+        return queue_depth(self.queue) + sum(waiting[lane] for lane in lanes)
+
+    def finished(self):
+        """Count a scan done, for the drain rate"""
+        key = f"{self.key}:finished:{int(time.time() // 60)}"
+        pipe = broker.get_redis().pipeline(transaction=False)
+        pipe.incr(key)
+        pipe.expire(key, (settings.DRAIN_WINDOW + 1) * 60)
+        pipe.execute()
+
+    def drain_rate(self) -> float:
+        """Scans finished a second over the last DRAIN_WINDOW whole minutes"""
+        minute = int(time.time() // 60)
+        counts = broker.get_redis().mget(
+            [
+                f"{self.key}:finished:{m}"
+                for m in range(minute - settings.DRAIN_WINDOW, minute)
+            ]
+        )
+        return sum(int(c or 0) for c in counts) / (settings.DRAIN_WINDOW * 60)
+
+    def retry_after(self, lane: str, high_water: int) -> Optional[int]:
+        """
+        Seconds until the scans ahead of a new one of `lane` drain below
+        `high_water` at the measured rate, None while they are below.
+        """
+        excess = self.ahead(lane) - high_water
+        if excess < 0:
+            return None
+        rate = self.drain_rate()
+        if not rate:
+            # nothing finished lately, the workers may well be down
+            return settings.RETRY_AFTER_MAX
+        return min(settings.RETRY_AFTER_MAX, max(1, math.ceil((excess + 1) / rate)))
+
+    def dispatch(self, send: Callable[[dict, int], bool]) -> int:
+        """
+        Hand scans to `send` with their priority until the broker holds
+        `depth`, how many it took. `send` returns False for a scan it
+        dropped, which leaves room for another.
+        """
+        room = self.depth - queue_depth(self.queue)
+        sent = 0
+        for lane in LANES:
+            while room > 0:
+                scan = self.pop(lane)
+                if scan is None:
+                    break
+                if send(scan, PRIORITY[lane]):
+                    room -= 1
+                    sent += 1
+        if sent:
+            L.info("Dispatched %d scans to %s", sent, self.queue)
+        return sent
+
+
+lanes = Lanes()
@@ -1,4 +1,29 @@
+import base64
+import json
+from datetime import datetime
+from typing import Any, Callable, Tuple, Union
+
+
 class AttrDict(dict):
     def __init__(self, *args, **kwargs):
         super(AttrDict, self).__init__(*args, **kwargs)
         self.__dict__ = self
+
+
+def encode_cursor(key: Tuple[Union[datetime, int], str]) -> str:
+    first, url = key
+    if isinstance(first, datetime):
+        first = first.isoformat()
+    raw = json.dumps([first, url]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def decode_cursor(
+    cursor: str, first: Callable[[Any], Any] = datetime.fromisoformat
+) -> Tuple[Any, str]:
+    """The key of `cursor`, its first part parsed by `first`"""
+    try:
+        value, url = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return first(value), url
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor {cursor}") from e
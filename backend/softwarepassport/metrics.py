@@ -0,0 +1,113 @@
+"""
+Prometheus metrics of the API and the workers.
+
+A process serves its own metrics, the API on /metrics and each worker
+on WORKER_METRICS_PORT. Processes forked from one another, the uvicorn
+workers or the Celery pool, share theirs through files when the
+`PROMETHEUS_MULTIPROC_DIR` environment variable names an empty directory
+as they start, and any of them serves the metrics of all.
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SECONDS = (0.1, 0.5, 1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200)
+SIZES = tuple(10**i for i in range(2, 11))
+
+STAGE_SECONDS = Histogram(
+    "softwarepassport_stage_seconds",
+    "Duration of the scan stages, from their START to their END state",
+    ["stage"],
+    buckets=SECONDS,
+)
+NOTARY_SECONDS = Histogram(
+    "softwarepassport_notary_seconds",
+    "Duration of the notarization on each chain",
+    ["chain"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    "softwarepassport_queue_wait_seconds",
+    "Time from queueing a scan to a worker starting it",
+    ["lane"],
+    buckets=SECONDS,
+)
+REPOSITORY_FILES = Histogram(
+    "softwarepassport_repository_files",
+    "Files of the scanned checkouts",
+    buckets=SIZES[:7],
+)
+REPOSITORY_BYTES = Histogram(
+    "softwarepassport_repository_bytes",
+    "Size of the scanned checkouts",
+    buckets=SIZES,
+)
+REPORT_BYTES = Histogram(
+    "softwarepassport_report_bytes",
+    "Size of the reports of the scans, before compression",
+    ["report"],
+    buckets=SIZES,
+)
+DB_ROUND_TRIPS = Histogram(
+    "softwarepassport_db_round_trips",
+    "Statements each API request sent to the database",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 1000),
+)
+
+# statements of the request being served, None outside of one
+round_trips: ContextVar[Optional[list]] = ContextVar("round_trips", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def count_round_trip(conn, cursor, statement, parameters, context, executemany):
+    counter = round_trips.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def registry() -> CollectorRegistry:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def exposition() -> bytes:
+    """The metrics in the Prometheus text format, see CONTENT_TYPE_LATEST"""
+    return generate_latest(registry())
+
+
+def serve(port: int):
+    """Serve the metrics on `port` from a thread of this process"""
+    start_http_server(port, registry=registry())
+
+
+class Stages:
+    """Time the stages of a scan from the State transitions bounding them"""
+
+    def __init__(self):
+        self.started = {}
+
+    def transition(self, state):
+        stage, _, edge = state.name.rpartition("_")
+        if edge == "START":
+            self.started[stage] = time.perf_counter()
+        elif edge == "END" and stage in self.started:
+            elapsed = time.perf_counter() - self.started.pop(stage)
+            STAGE_SECONDS.labels(stage.lower()).observe(elapsed)
+
@@ -0,0 +1,183 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, Optional
+
+from .config import settings
+
+if TYPE_CHECKING:
+    import git
+
+L = logging.getLogger("uvicorn.error")
+
+
+# what git says when the url definitely holds no repository
+NOT_FOUND = ("does not appear to be a git repository", "not found")
+
+
+class RepositoryNotFound(Exception):
+    pass
+
+
+class Unreachable(Exception):
+    pass
+
+
+def probe(url: str) -> Optional[str]:
+    """
+    Commit of the remote HEAD (`git ls-remote`), raises RepositoryNotFound
+    if there is no repository at `url` and Unreachable if it could not be
+    told (timeout, network, authentication).
+    """
+    import git
+
+    try:
+        out = git.cmd.Git().ls_remote(
+            url,
+            "HEAD",
+            kill_after_timeout=settings.LS_REMOTE_TIMEOUT,
+            env={"GIT_TERMINAL_PROMPT": "0"},
+        )
+    except git.exc.GitCommandError as e:
+        if any(message in str(e.stderr) for message in NOT_FOUND):
+            raise RepositoryNotFound(url) from e
+        raise Unreachable(str(e)) from e
+    return out.split()[0] if out else None
+
+
+def remote_head(url: str) -> Optional[str]:
+    """Commit of the remote HEAD, None if unreachable"""
+    try:
+        return probe(url)
+    except (RepositoryNotFound, Unreachable) as e:
+        L.warning("Failed to probe %s: %s", url, e)
+        return None
+
+
+def remote_heads(
+    urls: Iterable[str], workers: int = settings.LS_REMOTE_CONCURRENCY
+) -> Dict[str, Optional[str]]:
+    urls = list(urls)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(urls, executor.map(remote_head, urls)))
+
+
+def size_of(path: Path) -> int:
+    # another worker may evict or gc the mirror while it is measured
+    total = 0
+    for f in path.rglob("*"):
+        try:
+            if f.is_file():
+                total += f.stat().st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def mtime(path: Path) -> float:
+    try:
+        return path.stat().st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+class MirrorCache:
+    """
+    Bare mirrors of the scanned repositories, kept on the worker between scans.
+
+    A checkout fetches into the mirror of the url (cloning it on a miss)
+    and adds a detached worktree of its HEAD, so unchanged repositories
+    download nothing. The least recently used mirrors without worktrees
+    are evicted once the cache is bigger than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        root: str = settings.MIRROR_CACHE_DIR,
+        max_bytes: int = settings.MIRROR_CACHE_SIZE,
+    ):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, url: str) -> Path:
+        return self.root / f"{hashlib.sha1(url.encode()).hexdigest()}.git"
+
+    @contextmanager
+    def lock(self, mirror: Path):
+        # flock works across the threads and the processes of the workers
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(mirror.with_suffix(".lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def checkout(self, url: str, path: str) -> "git.Repo":
+        import git
+
+        mirror = self.path(url)
+        with self.lock(mirror):
+            if mirror.exists():
+                before = size_of(mirror)
+                repo = git.Repo(mirror)
+                repo.git.fetch("--prune", "origin")
+                self.hits += 1
+                hit = "hit"
+            else:
+                before = 0
+                repo = git.Repo.clone_from(url, mirror, mirror=True)
+                self.misses += 1
+                hit = "miss"
+            fetched = size_of(mirror) - before
+            repo.git.worktree("add", "--detach", path, "HEAD")
+            os.utime(mirror)
+        L.info(
+            "Mirror %s for %s, fetched %d bytes (hit rate %.2f)",
+            hit,
+            url,
+            fetched,
+            self.hits / (self.hits + self.misses),
+        )
+        self.evict()
+        return git.Repo(path)
+
+    def release(self, path: str):
+        """Remove a worktree made by `checkout`"""
+        import git
+
+        try:
+            common_dir = git.Repo(path).common_dir
+        except (git.exc.InvalidGitRepositoryError, git.exc.NoSuchPathError):
+            common_dir = None
+        shutil.rmtree(path, ignore_errors=True)
+        if common_dir:
+            mirror = Path(common_dir)
+            with self.lock(mirror):
+                git.Repo(mirror).git.worktree("prune")
+
+    def evict(self):
+        mirrors = sorted(self.root.glob("*.git"), key=mtime)
+        sizes = {m: size_of(m) for m in mirrors}
+        total = sum(sizes.values())
+        for mirror in mirrors:
+            if total <= self.max_bytes:
+                break
+            with self.lock(mirror):
+                worktrees = mirror / "worktrees"
+                if worktrees.exists() and any(worktrees.iterdir()):
+                    continue
+                # already evicted by another worker
+                shutil.rmtree(mirror, ignore_errors=True)
+            total -= sizes[mirror]
+            L.info("Evicted mirror %s (%d bytes), cache is %d bytes", mirror, sizes[mirror], total)
+
+
+mirrors = MirrorCache()
@@ -1,26 +1,55 @@
 import enum
-import errno
-import json
+import hashlib
 import logging
-import shutil
+import os
+import random
 import tempfile
-from datetime import datetime
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
 from io import StringIO
+from typing import IO, Dict, Iterable, List, Optional, Tuple
 
-import git
-import requests
-from reuse import lint
-from reuse.project import Project as ReuseProject
-from scancode.cli import run_scan
-from sqlalchemy import Boolean, Column, DateTime, Enum, Integer, String, desc
-from sqlalchemy.orm import Session, deferred, undefer
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    Index,
+    JSON,
+    Integer,
+    LargeBinary,
+    String,
+    and_,
+    desc,
+    func,
+    insert,
+    or_,
+    select,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, declared_attr, reconstructor
+import zstandard
 
+from . import blobcache, notary
+from .budget import cpu
+from .cache import summary_cache
 from .config import settings
-from .database import Base
+from .database import Base, sibling
+from .events import bus
 from .lib import AttrDict
+from .metrics import REPORT_BYTES, Stages
+from .mirrors import mirrors, remote_head
+from .pipeline import Pipeline
+from .reports import license_keys
 
 L = logging.getLogger("uvicorn.error")
 
+# rows per statement of the bulk queries
+CHUNK = 500
+
 
 class State(enum.Enum):
     PROJECT_CREATED = 0
@@ -34,32 +63,118 @@ class State(enum.Enum):
     SCANCODE_END = 8
 
 
+STARTS = {
+    State.CLONE_START,
+    State.REUSE_START,
+    State.BLOCKCHAIN_START,
+    State.SCANCODE_START,
+}
+UNKNOWN = object()
+
+
+class Trail:
+    """
+    State transitions of a scan run, written in batches.
+
+    The last state of the project is read once, a transition repeating
+    it is dropped as before, the others wait in memory with the time they
+    happened until `flush` inserts them at once. The transitions of the
+    stages which ran time them.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.last = UNKNOWN
+        self.pending: List[dict] = []
+        self.stages = Stages()
+        # the stages of a run log from their own threads
+        self.lock = threading.Lock()
+
+    def log(self, db: Session, state: State, output: str = None, ran: bool = True):
+        with self.lock:
+            if ran:
+                self.stages.transition(state)
+            if self.last is UNKNOWN:
+                latest = AuditLog.latest(self.url, db)
+                self.last = latest.state if latest else None
+            if state is self.last:
+                return
+            self.last = state
+            self.pending.append(
+                dict(
+                    url=self.url,
+                    state=state,
+                    output=output,
+                    date_created=datetime.utcnow(),
+                )
+            )
+
+    def flush(self, db: Session):
+        # held while inserting, ids follow the order of the transitions
+        with self.lock:
+            if not self.pending:
+                return
+            logs = AuditLog.insert_many(self.pending, db)
+            self.pending = []
+        summary_cache.bump()
+        for log in logs:
+            bus.publish(log.event())
+
+
+def tally(project) -> Counter:
+    """What `project` adds to the fleet wide counters, see `Stat`"""
+    counts = Counter()
+    if project.scancode_summary is not None:
+        counts["scanned"] = 1
+        licenses = project.scancode_summary.get("licenses", {})
+        keys = set().union(*map(license_keys, licenses))
+        counts.update(f"license:{key}" for key in keys)
+    if project.reuse_report_id is not None:
+        counts["reuse_checked"] = 1
+        counts["reuse_compliant"] = int(bool(project.reuse_compliant))
+    for chain, _, _, tag in notary.chains():
+        counts[f"notarized:{chain}"] = int(getattr(project, tag) is not None)
+    return counts
+
+
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (Index("ix_projects_date_created_url", "date_created", "url"),)
 
     url = Column(String, index=True, primary_key=True)
     hash = Column(String)
     reuse_compliant = Column(Boolean, default=False)
-    reuse_report = Column(String, default=None)
-    scancode_report = deferred(Column(String, default=None))
+    reuse_report_id = Column(String, default=None)
+    scancode_report_id = Column(String, default=None)
+    scancode_summary = Column(
+        JSON().with_variant(postgresql.JSONB(), "postgresql"), default=None
+    )
     sawroom_tag = Column(String, index=True, default=None)
     fabric_tag = Column(String, index=True, default=None)
     ethereum_tag = Column(String, index=True, default=None)
     planetmint_tag = Column(String, index=True, default=None)
     date_created = Column(DateTime, default=datetime.utcnow)
-    date_last_updated = Column(DateTime, default=datetime.utcnow)
+    date_last_updated = Column(DateTime, default=datetime.utcnow, index=True)
     description = Column(String, index=True, default=None)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.path = tempfile.mkdtemp()
+        self.counted = Counter()
+        self.counting = threading.Lock()
+
+    @reconstructor
+    def loaded(self):
+        # a loaded project is counted already
+        self.counted = tally(self)
+        self.counting = threading.Lock()
 
     def clone(self, db: Session):
         if not getattr(self, "path", False):
             self.path = tempfile.mkdtemp()
         self.__log(db, State.CLONE_START)
         try:
-            repo = git.Repo.clone_from(self.url, self.path, depth=1)
+            repo = mirrors.checkout(self.url, self.path)
             L.info("Cloned project %s", self.url)
         except Exception as e:
             self.cleanup()
@@ -74,17 +189,16 @@ class Project(Base):
         return False
 
     def cleanup(self):
-        try:
-            shutil.rmtree(self.path)  # delete directory
-        except OSError as exc:
-            if exc.errno != errno.ENOENT:  # ENOENT - no such file or directory
-                raise  # re-raise exception
+        mirrors.release(self.path)
 
     def reuse(self, db: Session):
+        from reuse import lint
+        from reuse.project import Project as ReuseProject
+
         L.info("Running reuse for %s", self.url)
         args = AttrDict(
             {
-                "no_multiprocessing": False,
+                "no_multiprocessing": True,
                 "quiet": False,
                 "verbose": True,
                 "debug": True,
@@ -92,37 +206,30 @@ class Project(Base):
         )
         result = StringIO()
         self.__log(db, State.REUSE_START)
-        self.reuse_compliant = not lint.run(
-            args, project=ReuseProject(self.path), out=result
-        )
+        with cpu.acquire():
+            self.reuse_compliant = not lint.run(
+                args, project=ReuseProject(self.path), out=result
+            )
         self.__log(db, State.REUSE_END)
-        self.reuse_report = result.getvalue().replace(self.path, "")
+        result = StringIO(result.getvalue().replace(self.path, ""))
+        REPORT_BYTES.labels("reuse").observe(len(result.getvalue().encode()))
+        self.reuse_report_id = ReportChunk.store(result, db)
         self.save(db=db)
 
     def scancode(self, db: Session):
         L.info("Running scancode for %s", self.url)
         self.__log(db, State.SCANCODE_START)
-        self.scancode_report = json.dumps(
-            run_scan(
-                self.path,
-                license=True,
-                copyright=True,
-                email=True,
-                consolidate=True,
-                strip_root=True,
-                n=8,
-            )[1]
-        )
+        with tempfile.NamedTemporaryFile("w+", suffix=".json") as report:
+            self.scancode_summary, index = blobcache.scan(self.path, db, report.name)
+            REPORT_BYTES.labels("scancode").observe(os.path.getsize(report.name))
+            report.seek(0)
+            self.scancode_report_id = ReportChunk.store(report, db)
+        LicenseIndex.replace(self.url, self.hash, index.licenses, db)
+        HolderIndex.replace(self.url, self.hash, index.holders, db)
         self.__log(db, State.SCANCODE_END)
         self.save(db=db)
 
     def blockchain(self, db: Session):
-        blockchains = [
-            (settings.SAWROOM, "mySawroomTag", "sawroom_tag"),
-            (settings.FABRIC, "myFabricTag", "fabric_tag"),
-            (settings.ETHEREUM, "txid", "ethereum_tag"),
-            (settings.PLANETMINT, "txid", "planetmint_tag"),
-        ]
         data = dict(
             data=dict(
                 input=dict(
@@ -131,62 +238,166 @@ class Project(Base):
             )
         )
         self.__log(db, State.BLOCKCHAIN_START)
-        for (url, param, tag) in blockchains:
-            try:
-                r = requests.post(url, json=data, timeout=10)
-                setattr(self, tag, r.json()[param])
-                L.debug("Blockchain response to %s: %s", url, r.json())
-            except Exception as e:
-                L.exception(f"Failed to post to blockchain {url}", e)
-                self.__log(db, State.BLOCKCHAIN_END)
-                pass
+        for tag, value in notary.notarize(data).items():
+            if value is not None:
+                setattr(self, tag, value)
         self.__log(db, State.BLOCKCHAIN_END)
+        self.save(db=db)
+
+    @property
+    def complete(self) -> bool:
+        """Whether every stage of the scan has a result for `hash`"""
+        return None not in [
+            self.hash,
+            self.reuse_report_id,
+            self.scancode_summary,
+            self.sawroom_tag,
+            self.fabric_tag,
+            self.ethereum_tag,
+            self.planetmint_tag,
+        ]
+
+    def unchanged(self, head: Optional[str] = None) -> bool:
+        """Whether the remote HEAD (probed if not given) was already scanned"""
+        if not self.complete:
+            return False
+        return (head or remote_head(self.url)) == self.hash
+
+    def __skip(self, start: State, end: State):
+        def stage(db: Session):
+            self.trail.log(db, start, ran=False)
+            self.trail.log(db, end, ran=False)
+
+        return stage
+
+    def pipeline(self, db: Session, existing: bool) -> Pipeline:
+        """
+        REUSE and scancode run side by side on the checkout, the notarization
+        follows REUSE. Each stage writes through its own session, stages
+        with a result for an unchanged hash only record their transitions.
+        """
+        reuse, blockchain, scancode = self.reuse, self.blockchain, self.scancode
+        if existing:
+            if self.reuse_report_id:
+                reuse = self.__skip(State.REUSE_START, State.REUSE_END)
+            if None not in [
+                self.sawroom_tag,
+                self.fabric_tag,
+                self.ethereum_tag,
+                self.planetmint_tag,
+            ]:
+                blockchain = self.__skip(State.BLOCKCHAIN_START, State.BLOCKCHAIN_END)
+            if self.scancode_summary is not None:
+                scancode = self.__skip(State.SCANCODE_START, State.SCANCODE_END)
+
+        def stage(fn):
+            def run():
+                with sibling(db) as session:
+                    try:
+                        fn(session)
+                    finally:
+                        self.trail.flush(session)
+
+            return run
+
+        return (
+            Pipeline()
+            .add("reuse", stage(reuse))
+            .add("scancode", stage(scancode))
+            .add("blockchain", stage(blockchain), after=["reuse"])
+        )
 
-    def scan(self, db: Session):
+    def scan(self, db: Session, head: Optional[str] = None):
+        if self.unchanged(head):
+            L.info("Skipping scan of %s, %s was already scanned", self.url, self.hash)
+            for state in list(State)[1:]:
+                self.trail.log(db, state, ran=False)
+            self.trail.flush(db)
+            self.save(db)
+            return
         try:
             existing = self.clone(db)
             L.debug("Scanning project %s", self.url)
-            if existing:
-                if not self.reuse_report:
-                    self.reuse(db)
-                else:
-                    self.__log(db, State.REUSE_START)
-                    self.__log(db, State.REUSE_END)
-                if None in [
-                    self.sawroom_tag,
-                    self.fabric_tag,
-                    self.ethereum_tag,
-                    self.planetmint_tag,
-                ]:
-                    try:
-                      self.blockchain(db)
-                    except Exception as e:
-                      pass
-                else:
-                    self.__log(db, State.BLOCKCHAIN_START)
-                    self.__log(db, State.BLOCKCHAIN_END)
-                if not self.scancode_report:
-                    self.scancode(db)
-                else:
-                    self.__log(db, State.SCANCODE_START)
-                    self.__log(db, State.SCANCODE_END)
-            else:
-                self.reuse(db)
-                self.blockchain(db)
-                self.scancode(db)
-
+            self.pipeline(db, existing).run()
             self.save(db)
-            self.cleanup()
         except Exception as e:
             pass
+        finally:
+            self.trail.flush(db)
+            self.cleanup()
 
     def save(self, db: Session):
         self.date_last_updated = datetime.utcnow()
         db.merge(self)
         db.flush()
+        # the stages save at once, each change is counted by one of them
+        with self.counting:
+            counts = tally(self)
+            delta = Counter(counts)
+            delta.subtract(self.counted)
+            self.counted = counts
+        Stat.add(delta, db)
+        summary_cache.bump()
 
     def delete(self, db: Session):
+        for index in (LicenseIndex, HolderIndex):
+            db.query(index).filter(index.url == self.url).delete(
+                synchronize_session=False
+            )
         db.delete(self)
+        db.flush()
+        with self.counting:
+            delta = Counter({"projects": 1}) + self.counted
+            self.counted = Counter()
+        Stat.add({name: -n for name, n in delta.items()}, db)
+        summary_cache.bump()
+
+    @classmethod
+    def register(cls, urls: Iterable[str], db: Session) -> List[str]:
+        """Insert the projects of `urls` not registered yet, their urls"""
+        urls = list(dict.fromkeys(urls))
+        existing = set()
+        for i in range(0, len(urls), CHUNK):
+            chunk = urls[i : i + CHUNK]
+            existing.update(u for u, in db.query(cls.url).filter(cls.url.in_(chunk)))
+        new = [url for url in urls if url not in existing]
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        now = datetime.utcnow()
+        rows = [dict(url=url, date_created=now, date_last_updated=now) for url in new]
+        inserted = 0
+        for i in range(0, len(rows), CHUNK):
+            # a concurrent registration of the same url wins, its scan is shared
+            inserted += db.execute(
+                dialect.insert(cls).values(rows[i : i + CHUNK]).on_conflict_do_nothing()
+            ).rowcount
+        Stat.add({"projects": inserted}, db)
+        if new:
+            summary_cache.bump()
+        return new
+
+    @classmethod
+    def stale(cls, db: Session, max_age: int, limit: int) -> List[str]:
+        """Urls of the `limit` projects not updated for longest, past `max_age`"""
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age)
+        return [
+            url
+            for url, in db.query(cls.url)
+            .filter(cls.date_last_updated < cutoff)
+            .order_by(cls.date_last_updated)
+            .limit(limit)
+        ]
+
+    @classmethod
+    def touch(cls, urls: Iterable[str], db: Session):
+        """Mark the projects of `urls` as up to date"""
+        urls = list(urls)
+        now = datetime.utcnow()
+        for i in range(0, len(urls), CHUNK):
+            db.query(cls).filter(cls.url.in_(urls[i : i + CHUNK])).update(
+                {cls.date_last_updated: now}, synchronize_session=False
+            )
+        if urls:
+            summary_cache.bump()
 
     @classmethod
     def by_hash(cls, url: str, hash: str, db: Session):
@@ -207,26 +418,275 @@ class Project(Base):
         return (
             db.query(cls)
             .order_by(desc(cls.date_created))
-            .options(undefer("scancode_report"))
             .offset(skip)
             .limit(limit)
             .all()
         )
 
+    @classmethod
+    def page(
+        cls,
+        after: Optional[Tuple[datetime, str]] = None,
+        limit: Optional[int] = None,
+    ) -> Select:
+        """
+        Projects from the newest, starting after the `(date_created, url)`
+        key of the last project of the previous page.
+        """
+        query = select(cls).order_by(desc(cls.date_created), desc(cls.url))
+        if after:
+            date_created, url = after
+            query = query.where(
+                or_(
+                    cls.date_created < date_created,
+                    and_(cls.date_created == date_created, cls.url < url),
+                )
+            )
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    @classmethod
+    def with_status(cls, db: Session, projects: List["Project"]) -> List["Project"]:
+        """Attach the status of their current run to `projects`"""
+        statuses = AuditLog.last_statuses(db, [p.url for p in projects])
+        for p in projects:
+            p.status = statuses.get(p.url, [])
+        return projects
+
+    @property
+    def key(self) -> Tuple[datetime, str]:
+        return (self.date_created, self.url)
+
+    def to_dict(self) -> dict:
+        result = {
+            c.key: getattr(self, c.key)
+            for c in self.__mapper__.column_attrs
+            if c.key not in ("reuse_report_id", "scancode_report_id")
+        }
+        result["status"] = getattr(self, "status", [])
+        return result
+
+    @property
+    def trail(self) -> Trail:
+        if getattr(self, "_trail", None) is None:
+            self._trail = Trail(self.url)
+        return self._trail
+
     def __log(self, db: Session, state: State, output: str = None):
-        latest = AuditLog.latest(self.url, db)
-        if latest and latest.state is state:
-            return
-        al = AuditLog(url=self.url, state=state, output=output)
-        db.merge(al)
-        db.flush()
+        # a stage starting writes the end of the previous one along
+        self.trail.log(db, state, output)
+        if state in STARTS:
+            self.trail.flush(db)
 
     def logs(self, db: Session):
         return AuditLog.by_url(self.url, db)
 
 
+class ReportChunk(Base):
+    """
+    Reports by the sha256 of their text, in zstd compressed pieces of
+    `REPORT_CHUNK_SIZE` characters. The same report, as the ones of
+    forks, is stored once and shared by the projects referencing it.
+    """
+
+    __tablename__ = "report_chunks"
+
+    report = Column(String, primary_key=True)
+    seq = Column(Integer, primary_key=True)
+    data = Column(LargeBinary)
+    date_last_used = Column(DateTime, default=datetime.utcnow, index=True)
+
+    @classmethod
+    def store(
+        cls, report: IO[str], db: Session, size: int = settings.REPORT_CHUNK_SIZE
+    ) -> str:
+        """Store the text of the seekable `report` unless known, its id"""
+        digest = hashlib.sha256()
+        for data in iter(lambda: report.read(size), ""):
+            digest.update(data.encode())
+        id = digest.hexdigest()
+        now = datetime.utcnow()
+        # a known report is only marked as used, out of reach of `collect`
+        touched = (
+            db.query(cls)
+            .filter(cls.report == id)
+            .update({cls.date_last_used: now}, synchronize_session=False)
+        )
+        if touched:
+            return id
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        compressor = zstandard.ZstdCompressor(level=settings.REPORT_COMPRESSION_LEVEL)
+        report.seek(0)
+        for seq, data in enumerate(iter(lambda: report.read(size), "")):
+            # the same report stored at once by another scan
+            db.execute(
+                dialect.insert(cls)
+                .values(
+                    report=id,
+                    seq=seq,
+                    data=compressor.compress(data.encode()),
+                    date_last_used=now,
+                )
+                .on_conflict_do_nothing()
+            )
+        return id
+
+    @classmethod
+    def read(cls, id: str) -> Select:
+        """Compressed pieces of the report `id`, see `decompress`"""
+        return select(cls.data).where(cls.report == id).order_by(cls.seq)
+
+    @staticmethod
+    def decompress(data: bytes) -> str:
+        return zstandard.ZstdDecompressor().decompress(data).decode()
+
+    @classmethod
+    def text(cls, id: str, db: Session) -> str:
+        return "".join(cls.decompress(data) for data, in db.execute(cls.read(id)))
+
+    @classmethod
+    def collect(cls, db: Session, max_age: int = settings.REPORT_MAX_AGE):
+        """Drop the reports no project references, unused for `max_age` days"""
+        cutoff = datetime.utcnow() - timedelta(days=max_age)
+        referenced = [
+            select(column).where(column.isnot(None))
+            for column in (Project.scancode_report_id, Project.reuse_report_id)
+        ]
+        deleted = (
+            db.query(cls)
+            .filter(
+                cls.date_last_used < cutoff,
+                cls.report.notin_(referenced[0].union(referenced[1])),
+            )
+            .delete(synchronize_session=False)
+        )
+        L.info("Collected %d report chunks unused since %s", deleted, cutoff)
+
+
+class Stat(Base):
+    """
+    Fleet wide counters: projects, scanned, REUSE checked and compliant,
+    notarized on each chain and with files of each license key. A counter
+    is the sum of its rows, a change is added to one of STATS_SLOTS rows
+    at random so the scans saving at once seldom wait on one another.
+    """
+
+    __tablename__ = "stats"
+
+    name = Column(String, primary_key=True)
+    slot = Column(Integer, primary_key=True)
+    value = Column(BigInteger, default=0)
+
+    @classmethod
+    def add(cls, deltas: Dict[str, int], db: Session):
+        slot = random.randrange(settings.STATS_SLOTS)
+        # in the same order everywhere, concurrent additions never deadlock
+        rows = [
+            dict(name=name, slot=slot, value=value)
+            for name, value in sorted(deltas.items())
+            if value
+        ]
+        if not rows:
+            return
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        for i in range(0, len(rows), CHUNK):
+            insert = dialect.insert(cls).values(rows[i : i + CHUNK])
+            db.execute(
+                insert.on_conflict_do_update(
+                    index_elements=[cls.name, cls.slot],
+                    set_=dict(value=cls.value + insert.excluded.value),
+                )
+            )
+
+    @classmethod
+    def totals(cls) -> Select:
+        """Name and value of the counters"""
+        return (
+            select(cls.name, func.sum(cls.value))
+            .group_by(cls.name)
+            .having(func.sum(cls.value) != 0)
+        )
+
+
+class ProjectIndex:
+    """
+    Projects by a term found in their scancode report, with the number of
+    files it is found in, the last scanned commit only. A search walks
+    the projects of a term in an index from the most files.
+    """
+
+    key = Column(String, primary_key=True)
+    url = Column(String, primary_key=True, index=True)
+    files = Column(Integer)
+    hash = Column(String)
+
+    @declared_attr
+    def __table_args__(cls):
+        return (Index(f"ix_{cls.__tablename__}_rank", "key", "files", "url"),)
+
+    @classmethod
+    def replace(cls, url: str, hash: str, counts: Dict[str, int], db: Session):
+        """Index the commit `hash` of `url` under `counts` instead of the last one"""
+        dialect = postgresql if db.bind.dialect.name == "postgresql" else sqlite
+        rows = [dict(key=k, url=url, files=n, hash=hash) for k, n in counts.items()]
+        # the new rows first, a search meanwhile never misses the project
+        for i in range(0, len(rows), CHUNK):
+            insert = dialect.insert(cls).values(rows[i : i + CHUNK])
+            db.execute(
+                insert.on_conflict_do_update(
+                    index_elements=[cls.key, cls.url],
+                    set_=dict(files=insert.excluded.files, hash=insert.excluded.hash),
+                )
+            )
+        db.query(cls).filter(cls.url == url, cls.hash != hash).delete(
+            synchronize_session=False
+        )
+
+    @classmethod
+    def search(
+        cls,
+        key: str,
+        after: Optional[Tuple[int, str]] = None,
+        limit: Optional[int] = None,
+    ) -> Select:
+        """
+        Projects of `key` with its files count, the most first, starting
+        after the `(files, url)` of the last one of the previous page.
+        """
+        query = (
+            select(cls.url, cls.files)
+            .where(cls.key == key)
+            .order_by(desc(cls.files), desc(cls.url))
+        )
+        if after:
+            files, url = after
+            query = query.where(
+                or_(cls.files < files, and_(cls.files == files, cls.url < url))
+            )
+        if limit:
+            query = query.limit(limit)
+        return query
+
+
+class LicenseIndex(ProjectIndex, Base):
+    """Projects by license key"""
+
+    __tablename__ = "license_index"
+
+
+class HolderIndex(ProjectIndex, Base):
+    """Projects by copyright holder, see `reports.normalize_holder`"""
+
+    __tablename__ = "holder_index"
+
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_logs_url_date_created", "url", "date_created"),
+        Index("ix_audit_logs_url_state_date_created", "url", "state", "date_created"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String, index=True)
@@ -238,6 +698,43 @@ class AuditLog(Base):
     def by_url(cls, url, db: Session):
         return db.query(cls).filter(url == url).all()
 
+    def event(self) -> dict:
+        return dict(
+            id=self.id,
+            url=self.url,
+            state=self.state.value,
+            date_created=self.date_created.isoformat(),
+        )
+
+    @classmethod
+    def insert_many(cls, rows: List[dict], db: Session) -> List["AuditLog"]:
+        """Insert `rows` with a single statement, the logs with their ids"""
+        if db.bind.dialect.name == "postgresql":
+            result = db.execute(insert(cls).values(rows).returning(cls.id))
+            # serial ids are drawn in the order of the rows
+            ids = sorted(id for id, in result)
+        else:
+            # the SQLite dialect has no INSERT ... RETURNING
+            ids = [
+                db.execute(insert(cls).values(row)).inserted_primary_key[0]
+                for row in rows
+            ]
+        return [cls(id=id, **row) for id, row in zip(ids, rows)]
+
+    @classmethod
+    def since(
+        cls,
+        id: int,
+        db: Session,
+        url: Optional[str] = None,
+        limit: int = settings.EVENTS_REPLAY_LIMIT,
+    ):
+        """The latest `limit` logs written after `id`, oldest first"""
+        query = db.query(cls).filter(cls.id > id)
+        if url:
+            query = query.filter(cls.url == url)
+        return list(reversed(query.order_by(desc(cls.id)).limit(limit).all()))
+
     @classmethod
     def latest(cls, url, db: Session):
         return (
@@ -269,3 +766,33 @@ class AuditLog(Base):
             if start
             else []
         )
+
+    @classmethod
+    def last_statuses(
+        cls, db: Session, urls: Optional[Iterable[str]] = None
+    ) -> Dict[str, List["AuditLog"]]:
+        """
+        Same as `last_status` for many projects (all of them when `urls` is
+        None) with a single query.
+        """
+        starts = db.query(
+            cls.url, func.max(cls.date_created).label("date_created")
+        ).filter(cls.state == State.CLONE_START)
+        if urls is not None:
+            starts = starts.filter(cls.url.in_(list(urls)))
+        starts = starts.group_by(cls.url).subquery()
+        logs = (
+            db.query(cls)
+            .join(
+                starts,
+                and_(
+                    cls.url == starts.c.url,
+                    cls.date_created >= starts.c.date_created,
+                ),
+            )
+            .order_by(cls.url, desc(cls.state))
+        )
+        statuses = defaultdict(list)
+        for log in logs:
+            statuses[log.url].append(log)
+        return statuses
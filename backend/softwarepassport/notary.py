@@ -0,0 +1,121 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, Optional
+
+import redis
+
+from . import broker
+from .config import settings
+from .metrics import NOTARY_SECONDS
+from .profiler import carry
+
+if TYPE_CHECKING:
+    import requests
+
+L = logging.getLogger("uvicorn.error")
+
+COUNTERS = "softwarepassport:notary"
+
+
+def chains():
+    """Name, zenbridge endpoint, response parameter and project column"""
+    return [
+        ("sawroom", settings.SAWROOM, "mySawroomTag", "sawroom_tag"),
+        ("fabric", settings.FABRIC, "myFabricTag", "fabric_tag"),
+        ("ethereum", settings.ETHEREUM, "txid", "ethereum_tag"),
+        ("planetmint", settings.PLANETMINT, "txid", "planetmint_tag"),
+    ]
+
+
+@lru_cache()
+def get_session() -> "requests.Session":
+    # keep-alive connections shared by every scan of the worker, retrying
+    # with exponential backoff only what never reached the chain: failed
+    # connections and refusals (429, 503). A write which timed out or got
+    # a 502/504 may have gone through, retrying it would notarize twice.
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    retry = Retry(
+        total=settings.NOTARY_RETRIES,
+        read=0,
+        other=0,
+        backoff_factor=settings.NOTARY_BACKOFF,
+        status_forcelist=(429, 503),
+        allowed_methods=frozenset(["POST"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=len(chains()),
+        pool_maxsize=settings.NOTARY_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.NOTARY_POOL_SIZE, thread_name_prefix="notary"
+)
+
+
+def record(chain: str, seconds: float, ok: bool):
+    try:
+        pipe = broker.get_redis().pipeline(transaction=False)
+        pipe.hincrby(COUNTERS, f"{chain}:requests", 1)
+        pipe.hincrby(COUNTERS, f"{chain}:errors", 0 if ok else 1)
+        pipe.hincrbyfloat(COUNTERS, f"{chain}:seconds", seconds)
+        pipe.execute()
+    except redis.RedisError as e:
+        L.warning("Failed to record notary metrics: %s", e)
+
+
+def stats() -> dict:
+    """Requests, errors and mean latency of each chain"""
+    try:
+        counters = broker.get_redis().hgetall(COUNTERS)
+    except redis.RedisError:
+        return {}
+    counters = {k.decode(): float(v) for k, v in counters.items()}
+    result = {}
+    for chain, *_ in chains():
+        requests_ = int(counters.get(f"{chain}:requests", 0))
+        result[chain] = dict(
+            requests=requests_,
+            errors=int(counters.get(f"{chain}:errors", 0)),
+            mean_seconds=counters.get(f"{chain}:seconds", 0) / requests_
+            if requests_
+            else None,
+        )
+    return result
+
+
+def post(chain: str, url: str, param: str, data: dict) -> Optional[str]:
+    start = time.perf_counter()
+    try:
+        r = get_session().post(url, json=data, timeout=settings.NOTARY_TIMEOUT)
+        r.raise_for_status()
+        value = r.json()[param]
+        L.debug("Blockchain response to %s: %s", url, r.json())
+    except Exception as e:
+        L.exception("Failed to post to blockchain %s: %s", url, e)
+        value = None
+    elapsed = time.perf_counter() - start
+    record(chain, elapsed, value is not None)
+    NOTARY_SECONDS.labels(chain).observe(elapsed)
+    L.info("Notarized on %s in %.2fs", chain, elapsed)
+    return value
+
+
+def notarize(data: dict) -> Dict[str, Optional[str]]:
+    """Submit `data` to every chain at once, tags by project column"""
+    futures = {
+        tag: executor.submit(carry(post), chain, url, param, data)
+        for chain, url, param, tag in chains()
+    }
+    return {tag: future.result() for tag, future in futures.items()}
@@ -0,0 +1,53 @@
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from .profiler import carry
+
+L = logging.getLogger("uvicorn.error")
+
+
+class Pipeline:
+    """
+    Stages of a scan as a small dependency graph, each stage starts in its
+    own thread as soon as the stages it comes `after` are done.
+
+    Stages depending on a failed one are skipped, the first error is raised
+    once every other stage finished.
+    """
+
+    def __init__(self):
+        self.stages: Dict[str, Tuple[Callable[[], None], List[str]]] = {}
+
+    def add(self, name: str, fn: Callable[[], None], after: Iterable[str] = ()):
+        self.stages[name] = (fn, list(after))
+        return self
+
+    def run(self):
+        pending = dict(self.stages)
+        running, done, failed = {}, set(), {}
+        with ThreadPoolExecutor(
+            max_workers=len(pending) or 1, thread_name_prefix="stage"
+        ) as executor:
+            while pending or running:
+                for name, (fn, after) in list(pending.items()):
+                    if any(a in failed for a in after):
+                        L.warning("Skipping %s, %s failed", name, after)
+                        failed[name] = None
+                        del pending[name]
+                    elif all(a in done for a in after):
+                        running[executor.submit(carry(fn))] = name
+                        del pending[name]
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    if future.exception():
+                        L.error("Stage %s failed: %s", name, future.exception())
+                        failed[name] = future.exception()
+                    else:
+                        done.add(name)
+        errors = [e for e in failed.values() if e is not None]
+        if errors:
+            raise errors[0]
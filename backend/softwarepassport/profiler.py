@@ -0,0 +1,106 @@
+import logging
+import os
+import random
+import sys
+import threading
+from collections import Counter
+from typing import Callable, Dict, Optional
+
+from .config import settings
+
+L = logging.getLogger("uvicorn.error")
+
+
+# the task each thread works for, while it is profiled
+owners: Dict[int, str] = {}
+
+
+def carry(fn: Callable) -> Callable:
+    """`fn` working for the task of the calling thread, in whichever thread"""
+    owner = owners.get(threading.get_ident())
+    if owner is None:
+        return fn
+
+    def run(*args, **kwargs):
+        ident = threading.get_ident()
+        owners[ident] = owner
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            owners.pop(ident, None)
+
+    return run
+
+
+class Sampler:
+    """
+    Sampling profiler of a task: the stacks of the threads working for it
+    every `interval` seconds, counted by stack. The workers run many tasks
+    in threads at once, a task works in its thread and in those it hands
+    work to through `carry`. `write` saves the stacks in the folded format
+    of flamegraph.pl and speedscope, a line per stack with the frames from
+    the outermost and its samples.
+
+    The scancode processes are left out, their time shows as the frames
+    of the threads waiting on them.
+    """
+
+    def __init__(self, task_id: str, interval: float = settings.PROFILE_INTERVAL):
+        self.task_id = task_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.done = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if owners.get(ident) != self.task_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                        f":{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self) -> "Sampler":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.done.set()
+        self.thread.join()
+
+    def write(self, path: str):
+        with open(path, "w") as f:
+            for stack, samples in self.stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+
+
+# the tasks profiled in this process, by task id
+samplers = {}
+
+
+def start(task_id: str):
+    """Profile the task `task_id` if it is among the PROFILE_RATE sampled"""
+    if random.random() < settings.PROFILE_RATE:
+        owners[threading.get_ident()] = task_id
+        samplers[task_id] = Sampler(task_id).start()
+
+
+def stop(task_id: str, name: str) -> Optional[str]:
+    """Stop profiling the task `task_id`, where its profile was saved"""
+    sampler = samplers.pop(task_id, None)
+    if sampler is None:
+        return None
+    owners.pop(threading.get_ident(), None)
+    sampler.stop()
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILE_DIR, f"{name}-{task_id}.folded")
+    sampler.write(path)
+    L.info("Profile of %s %s saved to %s", name, task_id, path)
+    return path
@@ -0,0 +1,77 @@
+import re
+from collections import Counter
+from typing import Iterable, Set
+
+# the operators of a license expression, the rest are license keys
+OPERATORS = {"and", "or", "with"}
+
+
+def file_license_expressions(f: dict) -> set:
+    # scancode >= 32 has a single detected expression, older ones a list
+    if f.get("detected_license_expression"):
+        return {f["detected_license_expression"]}
+    return set(f.get("license_expressions") or [])
+
+
+def summarize(report: dict) -> dict:
+    """
+    What the listings need of a scancode report: files and emails counts,
+    how many files carry each license expression and the copyright holders.
+    """
+    files = [f for f in report.get("files", []) if f.get("type") == "file"]
+    licenses = Counter()
+    for f in files:
+        licenses.update(file_license_expressions(f))
+    emails = Counter(e["email"] for f in files for e in f.get("emails") or [])
+    return dict(
+        files=len(files),
+        files_with_license=sum(1 for f in files if file_license_expressions(f)),
+        files_with_copyright=sum(1 for f in files if f.get("copyrights")),
+        licenses=dict(licenses.most_common()),
+        holders=[
+            dict(
+                identifier=c.get("identifier"),
+                consolidated_copyright=c.get("consolidated_copyright"),
+                consolidated_license_expression=c.get(
+                    "consolidated_license_expression"
+                ),
+                files_count=c.get("files_count"),
+            )
+            for c in report.get("consolidated_components", [])
+        ],
+        emails=sum(emails.values()),
+        distinct_emails=len(emails),
+    )
+
+
+def license_keys(expression: str) -> Set[str]:
+    """License keys of a license expression, lowercase"""
+    tokens = re.findall(r"[^\s()]+", expression.lower())
+    return {k for k in tokens if k not in OPERATORS}
+
+
+def normalize_holder(holder: str) -> str:
+    """`holder` as searched: case folded, spaces collapsed, no trailing punctuation"""
+    return " ".join(holder.split()).strip(" .,;:").casefold()
+
+
+class Index:
+    """
+    How many files of a scan carry each license key and each copyright
+    holder, normalized, for the search of the projects by either.
+    """
+
+    def __init__(self, files: Iterable[dict] = ()):
+        self.licenses = Counter()
+        self.holders = Counter()
+        for f in files:
+            self.add(f)
+
+    def add(self, f: dict):
+        if f.get("type") != "file":
+            return
+        self.licenses.update(
+            set().union(*map(license_keys, file_license_expressions(f)))
+        )
+        holders = {normalize_holder(h["holder"]) for h in f.get("holders") or []}
+        self.holders.update(holders - {""})
@@ -0,0 +1,162 @@
+import gc
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.pool import Pool
+from typing import List, Tuple
+
+from .config import settings
+from .reports import summarize
+
+L = logging.getLogger("uvicorn.error")
+
+OPTIONS = dict(license=True, copyright=True, email=True)
+SAMPLE = "# SPDX-License-Identifier: MIT\n# Copyright (c) 2020 Jane Doe <jane@example.org>\n"
+
+
+def warm() -> float:
+    """
+    Load the license index and the REUSE license list, and scan a sample
+    file for the detectors building their own tables on first use. The
+    seconds it took.
+    """
+    start = time.perf_counter()
+    import reuse._licenses  # noqa: F401
+    from licensedcode.cache import get_index
+
+    get_index()
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "sample.py"), "w") as f:
+            f.write(SAMPLE)
+        scan_chunk(tmp)
+    return time.perf_counter() - start
+
+
+def scan_chunk(location: str, options: dict = OPTIONS) -> Tuple[List[dict], float]:
+    """Files of the scan of `location` in the calling process, and its seconds"""
+    from scancode.cli import run_scan
+
+    start = time.perf_counter()
+    # all in memory, nothing is written to the temp dir the processes of
+    # the pool share with the worker, nothing to delete after the run
+    _, report = run_scan(
+        location,
+        strip_root=True,
+        only_findings=False,
+        quiet=True,
+        processes=0,
+        max_in_memory=0,
+        keep_temp_files=True,
+        **options,
+    )
+    return report["files"], time.perf_counter() - start
+
+
+def limit_memory(limit: int):
+    """Let the calling process grow `limit` bytes past its current size"""
+    with open("/proc/self/statm") as f:
+        size = int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    resource.setrlimit(resource.RLIMIT_AS, (size + limit, size + limit))
+
+
+def consolidate(location: str, output: str) -> dict:
+    """Consolidate the per file results at `location` into `output`, its summary"""
+    from scancode.cli import run_scan
+
+    _, report = run_scan(
+        location,
+        from_json=True,
+        consolidate=True,
+        strip_root=True,
+        only_findings=False,
+        quiet=True,
+        max_in_memory=0,
+        keep_temp_files=True,
+    )
+    with open(output, "w") as f:
+        json.dump(report, f)
+    return summarize(report)
+
+
+class ScannerPool:
+    """
+    Scancode processes kept warm between scans.
+
+    The worker loads the license index once and forks `size` processes
+    sharing it, a scan hands them its files in chunks which they scan in
+    process. `run_scan` on the whole checkout started a fresh pool for
+    every scan instead, the first one of the worker also loading the
+    index.
+    """
+
+    def __init__(
+        self,
+        size: int = settings.SCANNER_POOL_SIZE,
+        timeout: int = settings.SCANNER_TIMEOUT,
+        memory_limit: int = settings.SCANCODE_MEMORY_LIMIT,
+    ):
+        self.size = size
+        self.timeout = timeout
+        self.memory_limit = memory_limit
+        self.pool = None
+        self.lock = threading.Lock()
+
+    def start(self) -> Pool:
+        with self.lock:
+            if self.pool is None:
+                seconds = warm()
+                # the index stays out of the collections of the forked
+                # processes, its pages stay shared with the worker
+                gc.freeze()
+                self.pool = multiprocessing.get_context("fork").Pool(self.size)
+                L.info(
+                    "Started %d scanners, license index loaded in %.2fs",
+                    self.size,
+                    seconds,
+                )
+        return self.pool
+
+    def stop(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.close()
+                self.pool.join()
+                self.pool = None
+
+    def scan(
+        self, chunks: List[str], options: dict = OPTIONS
+    ) -> Tuple[List[dict], float]:
+        """Files of the scans of the `chunks` locations, the seconds scanning"""
+        pool = self.start()
+        pending = [pool.apply_async(scan_chunk, (chunk, options)) for chunk in chunks]
+        files, seconds = [], 0.0
+        for result in pending:
+            chunk_files, chunk_seconds = result.get(self.timeout)
+            files.extend(chunk_files)
+            seconds = max(seconds, chunk_seconds)
+        return files, seconds
+
+    def consolidate(self, location: str, output: str) -> dict:
+        """
+        Consolidate the per file results at `location` into the report
+        `output`, its summary. Scancode holds the whole codebase in memory
+        to consolidate it, it does so in a process of its own which fails
+        past `memory_limit` instead of the OOM killer taking the worker.
+        """
+        self.start()
+        with ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=limit_memory,
+            initargs=(self.memory_limit,),
+        ) as executor:
+            return executor.submit(consolidate, location, output).result(self.timeout)
+
+
+scanners = ScannerPool()
@@ -1,13 +1,19 @@
 from typing import Optional
 from datetime import datetime
 
-from pydantic import AnyUrl, BaseModel
+from pydantic import AnyUrl, BaseModel, conlist
+
+from .config import settings
 
 
 class RepoBase(BaseModel):
     url: AnyUrl
 
 
+class RepoBatch(BaseModel):
+    urls: conlist(AnyUrl, min_items=1, max_items=settings.REGISTER_BATCH_LIMIT)
+
+
 class Repo(RepoBase):
     date_created: Optional[datetime] = None
     date_last_updated: Optional[datetime] = None
@@ -0,0 +1,39 @@
+"""
+Local stand-in for the zenbridge write endpoints of apiroom.net
+
+    ZENBRIDGE_LATENCY=0.5 uvicorn softwarepassport.zenbridge:app --port 8100
+
+then point SAWROOM, FABRIC, ETHEREUM and PLANETMINT to
+http://127.0.0.1:8100/api/zenbridge/<chain>-write to test and benchmark
+the notarization without network. Every write answers after
+ZENBRIDGE_LATENCY seconds, a ZENBRIDGE_FAILURES share of them with a 503.
+"""
+import asyncio
+import os
+import random
+from uuid import uuid4
+
+from fastapi import FastAPI, HTTPException
+
+PARAMS = {
+    "sawroom-write": "mySawroomTag",
+    "fabric-write": "myFabricTag",
+    "ethereum-write": "txid",
+    "planetmint-write": "txid",
+}
+
+app = FastAPI(title="Zenbridge stand-in")
+app.state.latency = float(os.environ.get("ZENBRIDGE_LATENCY", 0))
+app.state.failures = float(os.environ.get("ZENBRIDGE_FAILURES", 0))
+app.state.requests = []
+
+
+@app.post("/api/zenbridge/{contract}")
+async def write(contract: str, body: dict):
+    if contract not in PARAMS:
+        raise HTTPException(status_code=404, detail=f"Unknown contract {contract}")
+    app.state.requests.append((contract, body))
+    await asyncio.sleep(app.state.latency)
+    if random.random() < app.state.failures:
+        raise HTTPException(status_code=503, detail="Zenbridge stand-in failure")
+    return {PARAMS[contract]: uuid4().hex}
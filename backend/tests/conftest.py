@@ -0,0 +1,63 @@
+import asyncio
+import os
+import tempfile
+
+import fakeredis
+import git
+import pytest
+from fakeredis import aioredis
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import close_all_sessions, sessionmaker
+
+from softwarepassport import broker
+from softwarepassport.database import Base, create_api_engine
+
+# a file, shared by the sync sessions of the tests and the async ones of the API
+DATABASE_URL = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async_engine = create_api_engine(DATABASE_URL)
+TestingAsyncSessionLocal = sessionmaker(
+    bind=async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def dispose_async_engine():
+    yield
+    # pooled aiosqlite connections keep a thread each, the run would not exit
+    asyncio.run(async_engine.dispose())
+
+
+@pytest.fixture()
+def test_db():
+    Base.metadata.create_all(bind=engine)
+    yield
+    # sessions left open by a test hold the lock of the database file
+    close_all_sessions()
+    Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(autouse=True)
+def redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeRedis(server=server)
+    monkeypatch.setattr(broker, "get_redis", lambda: client)
+    monkeypatch.setattr(broker, "get_async_redis", lambda: aioredis.FakeRedis(server=server))
+    return client
+
+
+def commit(repo: git.Repo, name: str, content: str) -> str:
+    os.makedirs(os.path.dirname(f"{repo.working_dir}/{name}"), exist_ok=True)
+    with open(f"{repo.working_dir}/{name}", "w") as f:
+        f.write(content)
+    repo.index.add([name])
+    return repo.index.commit(f"Add {name}").hexsha
+
+
+@pytest.fixture()
+def origin(tmp_path):
+    repo = git.Repo.init(tmp_path / "origin")
+    commit(repo, "README", "hello\n")
+    return repo
@@ -0,0 +1,50 @@
+import json
+
+from softwarepassport import blobcache
+from softwarepassport.blobcache import ScancodeBlob
+from softwarepassport.config import settings
+
+from .conftest import commit
+from .conftest import TestingSessionLocal
+
+
+def test_scan_reuses_blob_results(test_db, origin, monkeypatch, tmp_path):
+    commit(origin, "a.py", "# SPDX-License-Identifier: MIT\n# Copyright (c) 2020 Jane Doe\n")
+    commit(origin, "vendor/a.py", "# SPDX-License-Identifier: MIT\n# Copyright (c) 2020 Jane Doe\n")
+    db = TestingSessionLocal()
+    # the results go through the worker a file at a time
+    monkeypatch.setattr(settings, "SCANCODE_BATCH", 1)
+
+    summary, index = blobcache.scan(
+        origin.working_dir, db, str(tmp_path / "report.json"), n=1
+    )
+    report = json.loads((tmp_path / "report.json").read_text())
+    assert summary["files"] == 3 and summary["files_with_license"] == 2
+    assert index.licenses == {"mit": 2} and index.holders == {"jane doe": 2}
+    assert blobcache.stats() == {"hits": 0, "misses": 3, "hit_rate": 0.0}
+    assert db.query(ScancodeBlob).count() == 2
+
+    def scan_blobs(path, files, n):
+        raise AssertionError("every blob is cached")
+
+    monkeypatch.setattr(blobcache, "scan_blobs", scan_blobs)
+    cached_summary, cached_index = blobcache.scan(
+        origin.working_dir, db, str(tmp_path / "cached.json"), n=1
+    )
+    assert cached_summary == summary
+    assert cached_index.licenses == index.licenses and cached_index.holders == index.holders
+    cached = json.loads((tmp_path / "cached.json").read_text())
+    assert blobcache.stats() == {"hits": 3, "misses": 3, "hit_rate": 0.5}
+    assert cached["files"] == report["files"]
+    assert cached["consolidated_components"] == report["consolidated_components"]
+    [holder] = [c for c in cached["consolidated_components"] if c["identifier"].startswith("doe_jane")]
+    assert holder["files_count"] == 2
+
+
+def test_split_balances_chunks_by_size(tmp_path):
+    for name, size in [("a", 5), ("b", 4), ("c", 3), ("d", 2)]:
+        (tmp_path / name).write_text("x" * size)
+
+    chunks = blobcache.split(str(tmp_path), ["a", "b", "c", "d"], 2)
+    assert sorted(map(sorted, chunks)) == [["a", "d"], ["b", "c"]]
+    assert len(blobcache.split(str(tmp_path), ["a"], 4)) == 1
@@ -0,0 +1,37 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from softwarepassport.budget import CpuBudget
+
+
+def test_grants_at_most_the_free_cores(tmp_path):
+    budget = CpuBudget(root=tmp_path, cores=2)
+
+    with budget.acquire(4) as granted:
+        assert granted == 2
+    with budget.acquire(1) as one, budget.acquire(4) as rest:
+        assert (one, rest) == (1, 1)
+
+
+def test_holders_never_exceed_the_budget(tmp_path):
+    budget = CpuBudget(root=tmp_path, cores=3, poll=0.01)
+    lock = threading.Lock()
+    held, peak = 0, 0
+
+    def stage(want):
+        nonlocal held, peak
+        with budget.acquire(want) as granted:
+            with lock:
+                held += granted
+                peak = max(peak, held)
+            time.sleep(0.05)
+            with lock:
+                held -= granted
+        return granted
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        granted = list(executor.map(stage, [1, 2, 4] * 4))
+
+    assert peak <= 3
+    assert all(1 <= g <= w for g, w in zip(granted, [1, 2, 4] * 4))
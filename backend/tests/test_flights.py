@@ -0,0 +1,45 @@
+import time
+
+from softwarepassport.flights import Flight, running
+
+
+def test_duplicates_attach_to_the_scan_in_flight():
+    flight = Flight("https://example.org/a.git")
+    task_id, new = flight.start()
+    assert new
+
+    assert flight.start() == (task_id, False)
+    assert Flight("https://example.org/b.git").start()[1]
+
+    assert flight.release("another-task") is None
+    assert flight.start()[0] == task_id
+    assert flight.release(task_id) is None
+    assert flight.start()[1]
+
+
+def test_other_commit_scans_again_once_released():
+    flight = Flight("https://example.org/a.git")
+    task_id, _ = flight.start("1" * 40)
+    flight.hash(task_id, "1" * 40)
+
+    assert flight.start("1" * 40) == (task_id, False)
+    assert flight.release(task_id) is None
+
+    task_id, _ = flight.start()
+    flight.hash(task_id, "1" * 40)
+    assert flight.start("2" * 40) == (task_id, False)
+    assert flight.release(task_id) == "2" * 40
+
+
+def test_running_scans_renew_their_lease():
+    flight = Flight("https://example.org/a.git", heartbeat=0.1)
+    task_id, _ = flight.start()
+    with flight.hold(task_id):
+        time.sleep(1.5)
+        assert flight.start() == (task_id, False)
+        assert running() == 1
+    assert running() == 0
+
+    # the worker died without releasing it
+    time.sleep(1.2)
+    assert flight.start()[1]
@@ -1,32 +1,39 @@
-import pytest
+import asyncio
+import io
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import git
+from fastapi.concurrency import run_in_threadpool
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import StaticPool
-
-from softwarepassport.app import app, get_db
-from softwarepassport.database import Base
-
 
-engine = create_engine(
-    "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+from softwarepassport import app as app_module
+from softwarepassport.app import app, get_db, refresh_all_task, refresh_task, scan_task
+from softwarepassport.config import settings
+from softwarepassport.events import bus
+from softwarepassport.mirrors import Unreachable
+from softwarepassport.models import (
+    AuditLog,
+    HolderIndex,
+    LicenseIndex,
+    Project,
+    ReportChunk,
+    State,
+    Trail,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from softwarepassport.reports import summarize
 
-
-def override_get_db():
-    try:
-        db = TestingSessionLocal()
-        yield db
-    finally:
-        db.close()
+from .conftest import TestingAsyncSessionLocal, TestingSessionLocal, commit, engine
 
 
-@pytest.fixture()
-def test_db():
-    Base.metadata.create_all(bind=engine)
-    yield
-    Base.metadata.drop_all(bind=engine)
+async def override_get_db():
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+        await db.commit()
 
 
 app.dependency_overrides[get_db] = override_get_db
@@ -44,8 +51,530 @@ def test_index(test_db):
         {"name": "swagger_ui_redirect", "path": "/docs/oauth2-redirect"},
         {"name": "redoc_html", "path": "/redoc"},
         {"name": "root", "path": "/"},
-        {"name": "list_all_projects", "path": "/projects"},
-        {"name": "create_or_update_a_new_project", "path": "/project"},
+        {"name": "list_repositories", "path": "/repo_summary"},
+        {"name": "list_all_repositories", "path": "/repositories"},
+        {"name": "search", "path": "/search"},
+        {"name": "scancode_report", "path": "/scancode_report"},
+        {"name": "reuse_report", "path": "/reuse_report"},
+        {"name": "fleet_stats", "path": "/stats"},
+        {"name": "scancode_cache", "path": "/scancode_cache"},
+        {"name": "notary_stats", "path": "/notary_stats"},
+        {"name": "prometheus_metrics", "path": "/metrics"},
+        {"name": "db_pool", "path": "/db_pool"},
+        {"name": "health", "path": "/health"},
+        {"name": "create_or_update_a_new_repository", "path": "/repository"},
+        {"name": "register_repositories", "path": "/repositories/batch"},
         {"name": "scan", "path": "/scan"},
         {"name": "status", "path": "/status"},
+        {"name": "events", "path": "/events"},
+    ]
+
+
+def test_repo_summary_etag(test_db, redis):
+    response = client.get("/repo_summary")
+    etag = response.headers["etag"]
+
+    assert response.status_code == 200
+    assert response.json() == []
+    assert client.get("/repo_summary", headers={"If-None-Match": etag}).status_code == 304
+
+    db = TestingSessionLocal()
+    Project(url="https://example.org/project.git").save(db)
+    db.commit()
+
+    response = client.get("/repo_summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert [r["url"] for r in response.json()] == ["https://example.org/project.git"]
+
+    etag = response.headers["etag"]
+    redis.flushall()
+    response = client.get("/repo_summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_last_statuses(test_db):
+    db = TestingSessionLocal()
+    now = datetime.utcnow()
+    runs = [
+        ("https://example.org/a.git", now - timedelta(hours=1), list(State)[1:]),
+        ("https://example.org/a.git", now, [State.CLONE_START, State.CLONE_END]),
+        ("https://example.org/b.git", now, [State.CLONE_START]),
+        ("https://example.org/c.git", now, [State.PROJECT_CREATED]),
+    ]
+    for url, start, states in runs:
+        for i, state in enumerate(states):
+            db.add(AuditLog(url=url, state=state, date_created=start + timedelta(seconds=i)))
+    db.commit()
+
+    statuses = AuditLog.last_statuses(db)
+    assert set(statuses) == {"https://example.org/a.git", "https://example.org/b.git"}
+    for url in statuses:
+        assert statuses[url] == AuditLog.last_status(url, db)
+    assert {s.state for s in statuses["https://example.org/a.git"]} == {
+        State.CLONE_START,
+        State.CLONE_END,
+    }
+    assert list(AuditLog.last_statuses(db, ["https://example.org/b.git"])) == [
+        "https://example.org/b.git"
+    ]
+
+
+def test_event_bus():
+    a = {"id": 1, "url": "https://example.org/a.git", "state": 1}
+    b = {"id": 2, "url": "https://example.org/b.git", "state": 1}
+
+    async def listen():
+        async with bus.subscribe(a["url"]) as one, bus.subscribe() as every:
+            await run_in_threadpool(bus.publish, a)
+            await run_in_threadpool(bus.publish, b)
+            return (
+                [await one.get(1), await one.get(0.1)],
+                [await every.get(1), await every.get(1)],
+            )
+
+    one, every = asyncio.run(listen())
+    assert one == [a, None]
+    assert every == [a, b]
+
+
+def test_audit_log_since(test_db):
+    db = TestingSessionLocal()
+    for url in ["https://example.org/a.git", "https://example.org/b.git"] * 2:
+        db.add(AuditLog(url=url, state=State.CLONE_START))
+    db.commit()
+
+    assert [log.id for log in AuditLog.since(1, db)] == [2, 3, 4]
+    assert [log.id for log in AuditLog.since(1, db, "https://example.org/a.git")] == [3]
+    assert AuditLog.since(4, db) == []
+    assert [log.id for log in AuditLog.since(0, db, limit=2)] == [3, 4]
+
+
+def test_repositories_pagination(test_db, monkeypatch):
+    db = TestingSessionLocal()
+    now = datetime.utcnow()
+    for i in range(5):
+        db.add(
+            Project(
+                url=f"https://example.org/{i}.git",
+                date_created=now - timedelta(minutes=i // 2),
+                scancode_summary=summarize(dict(files=[])),
+            )
+        )
+    db.commit()
+
+    urls, page = [], "/repositories?limit=2"
+    while page:
+        response = client.get(page)
+        assert response.status_code == 200
+        assert all("scancode_report_id" not in r for r in response.json())
+        urls += [r["url"] for r in response.json()]
+        page = response.links.get("next", {}).get("url")
+    assert urls == [f"https://example.org/{i}.git" for i in [1, 0, 3, 2, 4]]
+
+    monkeypatch.setattr(settings, "PAGINATION_WINDOW", 2)
+    response = client.get("/repositories?stream=true")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [r["url"] for r in lines] == urls
+    assert all("scancode_report_id" not in r for r in lines)
+    assert all("status" in r for r in lines)
+
+    assert client.get("/repositories?cursor=nope").status_code == 400
+
+
+REPORT = {
+    "files": [
+        {
+            "path": "a.py",
+            "type": "file",
+            "detected_license_expression": "gpl-3.0",
+            "copyrights": [{"copyright": "Copyright (c) Jane Doe"}],
+            "emails": [{"email": "jane@example.org"}, {"email": "jane@example.org"}],
+        },
+        {"path": "b.py", "type": "file", "license_expressions": ["mit", "gpl-3.0"]},
+        {"path": "c.py", "type": "file", "license_expressions": []},
+        {"path": "d", "type": "directory"},
+    ],
+    "consolidated_components": [
+        {
+            "identifier": "doe_jane_1",
+            "consolidated_copyright": "Copyright (c) Jane Doe",
+            "consolidated_license_expression": "gpl-3.0",
+            "files_count": 1,
+        }
+    ],
+}
+
+
+def test_search_by_license_and_holder(test_db):
+    db = TestingSessionLocal()
+    for i in range(5):
+        db.add(Project(url=f"https://example.org/{i}.git"))
+        LicenseIndex.replace(
+            f"https://example.org/{i}.git", "1" * 40, {"gpl-3.0-only": i // 2, "mit": 1}, db
+        )
+    HolderIndex.replace("https://example.org/0.git", "1" * 40, {"jane doe": 3}, db)
+    db.commit()
+
+    urls, page = [], "/search?license=GPL-3.0-only&limit=2"
+    while page:
+        response = client.get(page)
+        assert response.status_code == 200
+        urls += [(r["url"], r["files"]) for r in response.json()]
+        page = response.links.get("next", {}).get("url")
+    assert urls == [
+        ("https://example.org/4.git", 2),
+        ("https://example.org/3.git", 1),
+        ("https://example.org/2.git", 1),
+        ("https://example.org/1.git", 0),
+        ("https://example.org/0.git", 0),
+    ]
+    response = client.get("/search", params={"holder": " Jane   DOE."})
+    assert response.json() == [{"url": "https://example.org/0.git", "files": 3}]
+
+    # a new commit replaces the terms of the last one
+    HolderIndex.replace("https://example.org/0.git", "2" * 40, {"john doe": 1}, db)
+    db.commit()
+    assert client.get("/search?holder=jane doe").json() == []
+    assert client.get("/search?holder=john doe").json()[0]["files"] == 1
+    Project.by_url("https://example.org/0.git", db).delete(db)
+    db.commit()
+    assert client.get("/search?holder=john doe").json() == []
+    assert len(client.get("/search?license=mit").json()) == 4
+
+    assert client.get("/search").status_code == 400
+    assert client.get("/search?license=mit&holder=x").status_code == 400
+    assert client.get("/search?license=mit OR gpl-2.0").status_code == 400
+    assert client.get("/search?license=mit&cursor=nope").status_code == 400
+
+
+def test_summarize():
+    assert summarize(REPORT) == {
+        "files": 3,
+        "files_with_license": 2,
+        "files_with_copyright": 1,
+        "licenses": {"gpl-3.0": 2, "mit": 1},
+        "holders": REPORT["consolidated_components"],
+        "emails": 2,
+        "distinct_emails": 1,
+    }
+
+
+def test_scancode_report(test_db):
+    db = TestingSessionLocal()
+    url = "https://example.org/project.git"
+    # a report of several chunks is sent whole
+    id = ReportChunk.store(io.StringIO(json.dumps(REPORT)), db, size=100)
+    chunks = db.query(ReportChunk).filter(ReportChunk.report == id).count()
+    assert chunks > 1
+    # the report of a fork is stored once
+    assert ReportChunk.store(io.StringIO(json.dumps(REPORT)), db, size=100) == id
+    assert db.query(ReportChunk).count() == chunks
+    reuse = ReportChunk.store(io.StringIO("Congratulations!"), db)
+    orphan = ReportChunk.store(io.StringIO("outdated"), db)
+    db.add(
+        Project(
+            url=url,
+            reuse_report_id=reuse,
+            scancode_report_id=id,
+            scancode_summary=summarize(REPORT),
+        )
+    )
+    db.commit()
+    ReportChunk.collect(db, max_age=-1)
+    db.commit()
+    assert ReportChunk.text(reuse, db) == "Congratulations!"
+    assert ReportChunk.text(orphan, db) == ""
+
+    [summary] = client.get("/repo_summary").json()
+    assert "scancode_report_id" not in summary and "reuse_report_id" not in summary
+    assert summary["scancode_summary"]["licenses"] == {"gpl-3.0": 2, "mit": 1}
+
+    assert client.get("/scancode_report", params={"url": url}).json() == REPORT
+    assert client.get("/scancode_report", params={"url": url + "x"}).status_code == 404
+    assert client.get("/reuse_report", params={"url": url}).text == "Congratulations!"
+
+
+def test_stats_follow_the_saves(test_db, monkeypatch):
+    monkeypatch.setattr(scan_task, "apply_async", lambda args, task_id, priority: None)
+    urls = [f"https://example.org/{i}.git" for i in range(3)]
+    assert client.post("/repositories/batch", json={"urls": urls}).status_code == 202
+    client.post("/repositories/batch", json={"urls": urls})
+    db = TestingSessionLocal()
+    first, second = Project.by_url(urls[0], db), Project.by_url(urls[1], db)
+    first.reuse_report_id, first.reuse_compliant = "r", True
+    first.scancode_summary, first.sawroom_tag = summarize(REPORT), "s"
+    first.save(db)
+    second.reuse_report_id, second.reuse_compliant = "r", False
+    second.scancode_summary = dict(licenses={"mit AND bsd-new": 2})
+    second.save(db)
+    # saved again unchanged
+    second.save(db)
+    db.commit()
+
+    stats = client.get("/stats").json()
+    assert stats == {
+        "projects": 3,
+        "scanned": 2,
+        "reuse": {"checked": 2, "compliant": 1, "compliance_rate": 0.5},
+        "notarized": {
+            "sawroom": {"projects": 1, "coverage": 1 / 3},
+            "fabric": {"projects": 0, "coverage": 0.0},
+            "ethereum": {"projects": 0, "coverage": 0.0},
+            "planetmint": {"projects": 0, "coverage": 0.0},
+        },
+        "licenses": {"mit": 2, "bsd-new": 1, "gpl-3.0": 1},
+    }
+
+    first.reuse_compliant = False
+    first.save(db)
+    Project.by_url(urls[1], db).delete(db)
+    db.commit()
+    stats = client.get("/stats").json()
+    assert stats["projects"] == 2 and stats["scanned"] == 1
+    assert stats["reuse"] == {"checked": 1, "compliant": 0, "compliance_rate": 0.0}
+    assert stats["licenses"] == {"gpl-3.0": 1, "mit": 1}
+
+
+def test_scan_skips_unchanged_remote_head(test_db, origin, monkeypatch):
+    def clone(self, db):
+        raise AssertionError("unchanged projects are not cloned")
+
+    monkeypatch.setattr(Project, "clone", clone)
+    db = TestingSessionLocal()
+    project = Project(
+        url=f"file://{origin.working_dir}",
+        hash=origin.head.object.hexsha,
+        reuse_report_id="",
+        scancode_summary={},
+        sawroom_tag="s",
+        fabric_tag="f",
+        ethereum_tag="e",
+        planetmint_tag="p",
+    )
+    project.scan(db)
+    db.commit()
+
+    assert {log.state for log in AuditLog.last_status(project.url, db)} == set(State) - {
+        State.PROJECT_CREATED
+    }
+    project.planetmint_tag = None
+    assert not project.unchanged()
+
+
+def test_scan_is_queued_once(test_db, monkeypatch):
+    queued = []
+    monkeypatch.setattr(
+        scan_task,
+        "apply_async",
+        lambda args, task_id, priority: queued.append((args, task_id)),
+    )
+    db = TestingSessionLocal()
+    db.add(Project(url="https://example.org/project.git"))
+    db.commit()
+
+    responses = [
+        client.post("/scan", json={"url": "https://example.org/project.git"}).json()
+        for _ in range(3)
     ]
+    assert len(queued) == 1
+    assert {r["task_id"] for r in responses} == {queued[0][1]}
+    assert client.post("/scan", json={"url": "https://example.org/x.git"}).status_code == 404
+
+
+def test_register_repositories_in_bulk(test_db, monkeypatch):
+    queued = {}
+    monkeypatch.setattr(
+        scan_task,
+        "apply_async",
+        lambda args, task_id, priority: queued.update({args[0]: task_id}),
+    )
+    monkeypatch.setattr(app_module.lanes, "depth", 2000)
+    db = TestingSessionLocal()
+    db.add(Project(url="https://example.org/0.git"))
+    db.commit()
+
+    urls = [f"https://example.org/{i}.git" for i in range(1200)]
+    response = client.post("/repositories/batch", json={"urls": urls + urls[:10]})
+    assert response.status_code == 202
+    tasks = response.json()
+    assert tasks["https://example.org/0.git"] is None
+    assert {url: tasks[url] for url in urls[1:]} == queued
+    assert db.query(Project).count() == 1200
+
+    response = client.post("/repository", json={"url": "https://example.org/new.git"})
+    assert response.status_code == 201
+    assert response.json()["task_id"] == queued["https://example.org/new.git"]
+    assert client.post("/repository", json={"url": "https://example.org/0.git"}).status_code == 206
+    assert client.post("/repositories/batch", json={"urls": []}).status_code == 422
+
+
+def test_scans_are_turned_away_past_the_high_water_mark(test_db, redis, monkeypatch):
+    monkeypatch.setattr(scan_task, "apply_async", lambda args, task_id, priority: None)
+    # the broker is full, the scans wait in the lanes
+    monkeypatch.setattr(app_module.lanes, "depth", 0)
+    monkeypatch.setattr(settings, "INTERACTIVE_HIGH_WATER", 2)
+    monkeypatch.setattr(settings, "BULK_HIGH_WATER", 5)
+    db = TestingSessionLocal()
+    db.add_all(Project(url=f"https://example.org/{i}.git") for i in range(3))
+    db.commit()
+
+    for i in range(2):
+        response = client.post("/scan", json={"url": f"https://example.org/{i}.git"})
+        assert response.status_code == 202
+    response = client.post("/scan", json={"url": "https://example.org/2.git"})
+    assert response.status_code == 429
+    # nothing finished lately
+    assert response.headers["Retry-After"] == str(settings.RETRY_AFTER_MAX)
+    assert client.post("/repository", json={"url": "https://example.org/new.git"}).status_code == 429
+    assert db.query(Project).count() == 3
+    # the bulk registrations have a mark of their own
+    urls = [f"https://example.org/bulk-{i}.git" for i in range(3)]
+    assert client.post("/repositories/batch", json={"urls": urls}).status_code == 202
+    assert client.post("/repositories/batch", json={"urls": urls}).status_code == 429
+
+    response = client.get("/health")
+    assert response.status_code == 503
+    state = response.json()
+    assert state["waiting"] == {"interactive": 2, "bulk": 3, "refresh": 0}
+    assert (state["queued"], state["running"]) == (0, 0)
+
+    # 60 scans finished a minute ago drain the one in excess in 10s
+    minute = int(time.time() // 60)
+    redis.set(f"{app_module.lanes.key}:finished:{minute - 1}", 60)
+    assert state["retry_after"]["bulk"] == settings.RETRY_AFTER_MAX
+    state = client.get("/health").json()
+    assert state["drain_rate"] == 0.1
+    assert state["retry_after"] == {"interactive": 10, "bulk": 10}
+
+    # a scan taken by a worker makes room for another
+    app_module.lanes.pop("interactive")
+    assert client.get("/health").status_code == 200
+    response = client.post("/scan", json={"url": "https://example.org/2.git"})
+    assert response.status_code == 202
+
+
+def test_scan_task_unregisters_invalid_repositories(test_db, tmp_path, monkeypatch):
+    # the sessions of the workers autocommit
+    monkeypatch.setattr(app_module, "SessionLocal", sessionmaker(bind=engine, autocommit=True))
+    db = TestingSessionLocal()
+    url = f"file://{tmp_path}/missing"
+    db.add(Project(url=url))
+    db.commit()
+
+    scan_task.apply((url,), task_id="invalid")
+    db.expire_all()
+    assert Project.by_url(url, db) is None
+
+
+def test_scan_task_retries_unreachable_repositories(test_db, monkeypatch):
+    monkeypatch.setattr(app_module, "SessionLocal", sessionmaker(bind=engine, autocommit=True))
+    probes = []
+
+    def probe(url):
+        probes.append(url)
+        raise Unreachable("Could not resolve host")
+
+    monkeypatch.setattr(app_module, "probe", probe)
+    db = TestingSessionLocal()
+    url = "https://example.org/unreachable.git"
+    db.add(Project(url=url))
+    db.commit()
+
+    result = scan_task.apply((url,), task_id="unreachable")
+    assert isinstance(result.result, Unreachable)
+    assert len(probes) == scan_task.max_retries + 1
+    db.expire_all()
+    assert Project.by_url(url, db) is not None
+
+
+def test_refresh_scans_the_changed_projects(test_db, tmp_path, origin, monkeypatch):
+    monkeypatch.setattr(app_module, "SessionLocal", sessionmaker(bind=engine, autocommit=True))
+    monkeypatch.setattr(settings, "REFRESH_BATCH", 2)
+    monkeypatch.setattr(settings, "REFRESH_BUDGET", 3)
+    queued = []
+    monkeypatch.setattr(
+        scan_task,
+        "apply_async",
+        lambda args, task_id, priority: queued.append((args[:2], priority)),
+    )
+    probed = []
+    remote_heads = app_module.remote_heads
+    monkeypatch.setattr(
+        app_module, "remote_heads", lambda urls: probed.extend(urls) or remote_heads(urls)
+    )
+    monkeypatch.setattr(refresh_task, "delay", refresh_task)
+    scanned = dict(
+        hash=origin.head.object.hexsha,
+        reuse_report_id="",
+        scancode_summary={},
+        sawroom_tag="s",
+        fabric_tag="f",
+        ethereum_tag="e",
+        planetmint_tag="p",
+    )
+    changed = git.Repo.clone_from(origin.working_dir, tmp_path / "changed")
+    now = datetime.utcnow()
+    db = TestingSessionLocal()
+    db.add(Project(url=f"file://{origin.working_dir}", date_last_updated=now - timedelta(days=3), **scanned))
+    db.add(Project(url=f"file://{changed.working_dir}", date_last_updated=now - timedelta(days=2), **scanned))
+    db.add(Project(url=f"file://{tmp_path}/missing", date_last_updated=now - timedelta(days=4)))
+    # over the budget, and up to date
+    db.add(Project(url="https://example.org/later.git", date_last_updated=now - timedelta(days=1, minutes=1)))
+    db.add(Project(url="https://example.org/fresh.git", date_last_updated=now))
+    db.commit()
+    head = commit(changed, "LICENSE", "MIT\n")
+
+    refresh_all_task.apply()
+    assert queued == [((f"file://{changed.working_dir}", head), 9)]
+    assert probed == [f"file://{tmp_path}/missing", f"file://{origin.working_dir}", f"file://{changed.working_dir}"]
+
+    # the probed ones are up to date, the next run takes the rest
+    probed.clear()
+    refresh_all_task.apply()
+    assert probed == ["https://example.org/later.git"]
+
+
+def test_api_does_not_load_the_scan_engines():
+    probe = "import sys, softwarepassport.app as a; print([m for m in a.ENGINES if m in sys.modules])"
+    out = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    ).stdout
+    assert out.strip() == "[]"
+
+
+def test_trail_keeps_order_and_drops_repeated_states(test_db, monkeypatch):
+    published = []
+    monkeypatch.setattr(bus, "publish", published.append)
+    db = TestingSessionLocal()
+    url = "https://example.org/project.git"
+    db.add(AuditLog(url=url, state=State.CLONE_START))
+    db.commit()
+
+    trail = Trail(url)
+    for state in [State.CLONE_START, State.CLONE_END, State.CLONE_END, State.REUSE_START]:
+        trail.log(db, state)
+    assert db.query(AuditLog).count() == 1
+    trail.flush(db)
+    trail.flush(db)
+    db.commit()
+
+    logs = db.query(AuditLog).order_by(AuditLog.id).all()
+    assert [log.state for log in logs] == [
+        State.CLONE_START,
+        State.CLONE_END,
+        State.REUSE_START,
+    ]
+    assert logs[1].date_created <= logs[2].date_created
+    assert [e["id"] for e in published] == [logs[1].id, logs[2].id]
+
+
+def test_db_pool_records_checkouts(test_db):
+    before = client.get("/db_pool").json()["checkouts"]
+    client.get("/repositories")
+    pool = client.get("/db_pool").json()
+
+    assert pool["checkouts"] > before
+    assert pool["max_wait_seconds"] >= pool["mean_wait_seconds"] >= 0
@@ -0,0 +1,33 @@
+from softwarepassport.lanes import Lanes, queue_depth
+
+
+def test_lanes_serve_interactive_first_and_submitters_in_turn(redis):
+    lanes = Lanes(depth=4)
+    for i in range(3):
+        lanes.push("bulk", "importer", dict(url=f"https://example.org/import-{i}.git"))
+    lanes.push("refresh", "refresh", dict(url="https://example.org/stale.git"))
+    lanes.push("bulk", "someone", dict(url="https://example.org/mine.git"))
+    lanes.push("interactive", "ui", dict(url="https://example.org/ui.git"))
+    assert lanes.waiting() == {"interactive": 1, "bulk": 4, "refresh": 1}
+
+    sent = []
+    assert lanes.dispatch(lambda scan, priority: sent.append((scan["url"], priority)) or True) == 4
+    assert sent == [
+        ("https://example.org/ui.git", 0),
+        ("https://example.org/import-0.git", 5),
+        ("https://example.org/mine.git", 5),
+        ("https://example.org/import-1.git", 5),
+    ]
+
+    # the broker is full until the workers take its scans
+    redis.rpush("heavy:5", "a", "b", "c")
+    redis.rpush("heavy", "d")
+    assert queue_depth("heavy") == 4
+    assert lanes.dispatch(lambda scan, priority: True) == 0
+    redis.delete("heavy", "heavy:5")
+
+    # dropped scans leave their room to the next ones
+    sent.clear()
+    assert lanes.dispatch(lambda scan, priority: sent.append(scan["url"]) and False) == 0
+    assert sent == ["https://example.org/import-2.git", "https://example.org/stale.git"]
+    assert lanes.waiting() == {"interactive": 0, "bulk": 0, "refresh": 0}
@@ -0,0 +1,80 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import REGISTRY
+
+from softwarepassport import profiler
+from softwarepassport.config import settings
+from softwarepassport.models import State, Trail
+
+from .conftest import TestingSessionLocal
+from .test_ipr import client
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_requests_count_their_db_round_trips(test_db):
+    endpoint = "list_all_repositories"
+    count = sample("softwarepassport_db_round_trips_count", endpoint=endpoint)
+    total = sample("softwarepassport_db_round_trips_sum", endpoint=endpoint)
+    assert client.get("/repositories").status_code == 200
+    assert sample("softwarepassport_db_round_trips_count", endpoint=endpoint) == count + 1
+    assert sample("softwarepassport_db_round_trips_sum", endpoint=endpoint) > total
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'softwarepassport_db_round_trips_count{endpoint="list_all_repositories"}' in response.text
+
+
+def test_stages_are_timed_between_their_transitions(test_db):
+    db = TestingSessionLocal()
+    count = sample("softwarepassport_stage_seconds_count", stage="reuse")
+    total = sample("softwarepassport_stage_seconds_sum", stage="reuse")
+    trail = Trail("https://example.org/a.git")
+    trail.log(db, State.REUSE_START)
+    time.sleep(0.1)
+    trail.log(db, State.REUSE_END)
+    # the transitions of a skipped stage are not timed
+    trail.log(db, State.REUSE_START, ran=False)
+    trail.log(db, State.REUSE_END, ran=False)
+
+    assert sample("softwarepassport_stage_seconds_count", stage="reuse") == count + 1
+    assert sample("softwarepassport_stage_seconds_sum", stage="reuse") - total >= 0.1
+
+
+def test_sampled_tasks_are_profiled(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "PROFILE_RATE", 0.0)
+    profiler.start("skipped")
+    assert profiler.stop("skipped", "scan_task") is None
+
+    def busy():
+        start = time.perf_counter()
+        while time.perf_counter() - start < 0.3:
+            pass
+
+    def idle():
+        time.sleep(0.3)
+
+    monkeypatch.setattr(settings, "PROFILE_RATE", 1.0)
+    profiler.start("task")
+    # a thread working for another task
+    other = threading.Thread(target=busy)
+    other.start()
+    with ThreadPoolExecutor() as executor:
+        executor.submit(profiler.carry(idle))
+        busy()
+    other.join()
+    path = profiler.stop("task", "scan_task")
+    assert path == str(tmp_path / "scan_task-task.folded")
+    stacks = dict(
+        line.rsplit(" ", 1)
+        for line in (tmp_path / "scan_task-task.folded").read_text().splitlines()
+    )
+    [samples] = [n for stack, n in stacks.items() if ";busy (test_metrics.py" in stack]
+    assert int(samples) > 5
+    assert any(";idle (test_metrics.py" in stack for stack in stacks)
+    assert not any(stack.startswith("_bootstrap") and "busy" in stack for stack in stacks)
@@ -0,0 +1,73 @@
+import shutil
+
+import git
+
+from softwarepassport import mirrors
+from softwarepassport.mirrors import MirrorCache, remote_head, remote_heads
+
+from .conftest import commit
+
+
+def test_checkout_fetches_into_the_mirror(tmp_path, origin):
+    cache = MirrorCache(root=tmp_path / "mirrors", max_bytes=10 * 1024**2)
+    url = f"file://{origin.working_dir}"
+
+    first = cache.checkout(url, str(tmp_path / "first"))
+    assert first.head.object.hexsha == origin.head.object.hexsha
+    assert (tmp_path / "first" / "README").read_text() == "hello\n"
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    head = commit(origin, "LICENSE", "MIT\n")
+    second = cache.checkout(url, str(tmp_path / "second"))
+    assert second.head.object.hexsha == head
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    cache.release(str(tmp_path / "first"))
+    cache.release(str(tmp_path / "second"))
+    assert not (tmp_path / "first").exists()
+    assert not (cache.path(url) / "worktrees").exists()
+
+
+def test_evicts_least_recently_used_mirrors(tmp_path, origin):
+    other = git.Repo.init(tmp_path / "other")
+    commit(other, "README", "other\n")
+    cache = MirrorCache(root=tmp_path / "mirrors", max_bytes=0)
+    url, other_url = f"file://{origin.working_dir}", f"file://{other.working_dir}"
+
+    cache.checkout(url, str(tmp_path / "in-use"))
+    cache.checkout(other_url, str(tmp_path / "other-checkout"))
+    cache.release(str(tmp_path / "other-checkout"))
+    cache.evict()
+
+    assert cache.path(url).exists()
+    assert not cache.path(other_url).exists()
+
+    cache.release(str(tmp_path / "in-use"))
+    cache.evict()
+    assert not cache.path(url).exists()
+
+
+def test_evict_tolerates_mirrors_removed_by_another_worker(tmp_path, origin, monkeypatch):
+    cache = MirrorCache(root=tmp_path / "mirrors", max_bytes=0)
+    url = f"file://{origin.working_dir}"
+    cache.checkout(url, str(tmp_path / "checkout"))
+    cache.release(str(tmp_path / "checkout"))
+
+    measure = mirrors.size_of
+
+    def size_of(path):
+        # the other worker evicts it while this one lists the cache
+        shutil.rmtree(path, ignore_errors=True)
+        return measure(path)
+
+    monkeypatch.setattr(mirrors, "size_of", size_of)
+    cache.evict()
+    assert not cache.path(url).exists()
+
+
+def test_remote_heads(tmp_path, origin):
+    url = f"file://{origin.working_dir}"
+    missing = f"file://{tmp_path}/missing"
+
+    assert remote_head(url) == origin.head.object.hexsha
+    assert remote_heads([url, missing]) == {url: origin.head.object.hexsha, missing: None}
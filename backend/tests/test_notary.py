@@ -0,0 +1,54 @@
+import socket
+import threading
+import time
+
+import pytest
+import uvicorn
+
+from softwarepassport import notary, zenbridge
+from softwarepassport.config import settings
+
+
+@pytest.fixture(scope="module")
+def zenbridge_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(zenbridge.app, port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{port}/api/zenbridge"
+    server.should_exit = True
+    thread.join()
+
+
+@pytest.fixture()
+def chains(zenbridge_url, monkeypatch):
+    for chain in ["sawroom", "fabric", "ethereum", "planetmint"]:
+        monkeypatch.setattr(settings, chain.upper(), f"{zenbridge_url}/{chain}-write")
+    zenbridge.app.state.requests.clear()
+    yield zenbridge.app.state
+    zenbridge.app.state.latency = 0
+    zenbridge.app.state.failures = 0
+
+
+def test_notarize_concurrently(chains):
+    chains.latency = 0.3
+    start = time.perf_counter()
+    tags = notary.notarize({"data": {"input": {"url": "https://example.org/a.git"}}})
+
+    assert time.perf_counter() - start < 4 * chains.latency
+    assert set(tags) == {"sawroom_tag", "fabric_tag", "ethereum_tag", "planetmint_tag"}
+    assert None not in tags.values()
+    assert notary.stats()["fabric"]["requests"] == 1
+
+
+def test_notarize_retries(chains):
+    chains.failures = 1
+    tags = notary.notarize({"data": {}})
+
+    assert tags == dict.fromkeys(tags)
+    assert len(chains.requests) == 4 * (settings.NOTARY_RETRIES + 1)
+    assert notary.stats()["sawroom"]["errors"] == 1
@@ -0,0 +1,88 @@
+import json
+import time
+
+import pytest
+import reuse.lint
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from softwarepassport import models
+from softwarepassport.database import Base
+from softwarepassport.mirrors import MirrorCache
+from softwarepassport.models import AuditLog, Project, State
+from softwarepassport.pipeline import Pipeline
+from softwarepassport.reports import Index, summarize
+
+
+def test_pipeline_runs_independent_stages_together():
+    calls = []
+
+    def stage(name, seconds=0.0):
+        def run():
+            calls.append((name, "start"))
+            time.sleep(seconds)
+            calls.append((name, "end"))
+
+        return run
+
+    start = time.perf_counter()
+    Pipeline().add("a", stage("a", 0.3)).add("b", stage("b", 0.3)).add(
+        "c", stage("c"), after=["a"]
+    ).run()
+
+    assert time.perf_counter() - start < 0.5
+    assert calls.index(("c", "start")) > calls.index(("a", "end"))
+
+
+def test_pipeline_skips_stages_after_a_failure():
+    calls = []
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        Pipeline().add("a", fail).add("b", lambda: calls.append("b")).add(
+            "c", lambda: calls.append("c"), after=["a"]
+        ).run()
+    assert calls == ["b"]
+
+
+def test_scan_runs_reuse_and_scancode_in_parallel(tmp_path, origin, monkeypatch):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'db.sqlite'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(autocommit=True, autoflush=False, bind=engine)()
+
+    def run(args, project, out):
+        time.sleep(1)
+        return 0
+
+    def scan(path, db, report, n=None):
+        time.sleep(1)
+        with open(report, "w") as f:
+            json.dump(dict(files=[], consolidated_components=[]), f)
+        return summarize(dict(files=[], consolidated_components=[])), Index()
+
+    def notarize(data):
+        return dict(sawroom_tag="s", fabric_tag="f", ethereum_tag="e", planetmint_tag="p")
+
+    monkeypatch.setattr(reuse.lint, "run", run)
+    monkeypatch.setattr(models.blobcache, "scan", scan)
+    monkeypatch.setattr(models.notary, "notarize", notarize)
+    monkeypatch.setattr(models, "mirrors", MirrorCache(root=tmp_path / "mirrors"))
+
+    project = Project(url=f"file://{origin.working_dir}")
+    start = time.perf_counter()
+    project.scan(db)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 1.8
+    saved = Project.by_url(project.url, db)
+    assert saved.reuse_compliant and saved.scancode_summary["files"] == 0
+    assert saved.scancode_report_id
+    assert saved.planetmint_tag == "p"
+    logs = db.query(AuditLog).order_by(AuditLog.id).all()
+    states = [log.state for log in logs]
+    assert set(states) == set(State) - {State.PROJECT_CREATED}
+    assert states.index(State.BLOCKCHAIN_START) > states.index(State.REUSE_END)
@@ -0,0 +1,24 @@
+import os
+
+from softwarepassport.blobcache import OPTIONS
+from softwarepassport.scanners import ScannerPool
+
+
+def test_scanners_scan_chunks_in_warm_processes(tmp_path):
+    for i in range(3):
+        os.makedirs(tmp_path / str(i))
+        (tmp_path / str(i) / f"m{i}.py").write_text(
+            f"# SPDX-License-Identifier: MIT\n# Copyright (c) 2020 Author {i}\n"
+        )
+    pool = ScannerPool(size=2)
+    try:
+        files, seconds = pool.scan([str(tmp_path / str(i)) for i in range(3)], OPTIONS)
+        again, _ = pool.scan([str(tmp_path / "0")], OPTIONS)
+    finally:
+        pool.stop()
+
+    files = [f for f in files if f["type"] == "file"]
+    assert sorted(f["path"] for f in files) == ["m0.py", "m1.py", "m2.py"]
+    assert all(f["detected_license_expression"] == "mit" for f in files)
+    assert [f["path"] for f in again if f["type"] == "file"] == ["m0.py"]
+    assert seconds > 0
@@ -5,7 +5,7 @@ import {SWRConfig} from 'swr'
 function MyApp({Component, pageProps}: AppProps) {
   return (
     <SWRConfig value={{
-      refreshInterval: 500,
+      refreshInterval: 5000,
       fetcher: (resource: string, init) => {
         return fetch(resource, init).then((res) => res.json())
       }
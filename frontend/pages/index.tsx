@@ -3,7 +3,7 @@ import dayjs from 'dayjs'
 import relativeTime from 'dayjs/plugin/relativeTime'
 
 import useSwr from 'swr'
-import {useState} from 'react'
+import {useEffect, useState} from 'react'
 import StatusBar from '../components/StatusBar'
 import VerificationButton from '../components/VerificationButton'
 import CopyrightHolders from '../components/CopyrightHolders'
@@ -18,8 +18,7 @@ interface Repository {
   date_last_updated: string;
   date_created: string;
   reuse_compliant: boolean;
-  scancode_report: any;
-  reuse_report: string;
+  scancode_summary: any;
   fabric_tag: string;
   sawroom_tag: string;
   ethereum_tag: string;
@@ -30,11 +29,17 @@ interface Repository {
 }
 
 const Home: NextPage = () => {
-  const {data, error} = useSwr(`${API_URL}/repo_summary`)
+  const {data, error, mutate} = useSwr(`${API_URL}/repo_summary`)
   const [repo, addRepo] = useState("")
   const [alert, setAlert] = useState("")
   const [alertType, setAlertType] = useState("")
 
+  useEffect(() => {
+    const events = new EventSource(`${API_URL}/events`)
+    events.onmessage = () => mutate()
+    return () => events.close()
+  }, [mutate])
+
   const options = {
     headers: {
       'Accept': 'application/json',
@@ -140,13 +145,13 @@ const Home: NextPage = () => {
                 <td>
                   <div className="flex flex-col space-y-2">
                     {
-                      repository?.scancode_report && <>
+                      repository?.scancode_summary && <>
                         <label htmlFor={repository.hash} className="btn btn-xs modal-button">scancode result</label>
 
                         <input type="checkbox" id={repository.hash} className="modal-toggle" />
                         <label htmlFor={repository.hash} className="cursor-pointer modal">
                           <label className="relative min-w-fit modal-box" htmlFor="">
-                            <CopyrightHolders holders={JSON.parse(repository.scancode_report)?.consolidated_components || []} />
+                            <CopyrightHolders holders={repository.scancode_summary?.holders || []} />
                           </label>
                         </label>
 